@@ -0,0 +1,180 @@
+"""
+Caches for finished responses, so that repeat requests skip both the graph work
+and the JSON encoding.
+All the backends store bytes values under string keys, and count their hits and
+misses. Pick one with the CACHE_BACKEND setting (see make_cache):
+
+- "memory": an LRUCache in each worker process
+- "redis": a RedisCache, shared between workers and emptied by `fab bust`
+- "fake": a RedisCache backed by FakeRedis, for tests and local development
+- None: no caching
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_key(*parts):
+    """ Cache key from its parts, e.g. make_key("streets", 123, 2000.0) """
+    return ":".join(str(part) for part in parts)
+
+
+class LRUCache(object):
+    """
+    Least-recently-used cache of bytes values, bounded by their total size rather than
+    by the number of entries, with an optional time-to-live in seconds. Safe to share
+    between threads.
+    """
+
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """ Return the value for key, or None if it isn't cached """
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[1] is not None and item[1] < time.time():
+                self._remove(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value):
+        """ Cache value under key, evicting the least recently used values to fit it """
+        if len(value) > self.max_bytes:
+            return
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[key] = (value, expires)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._items)))
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        value, _ = self._items.pop(key)
+        self.size -= len(value)
+
+
+class RedisCache(object):
+    """
+    Cache backed by a Redis database, shared between worker processes. Redis' own
+    maxmemory policy bounds its size; values bigger than max_bytes aren't cached.
+    The hit and miss counts are this process's.
+    """
+
+    def __init__(self, client, max_bytes, ttl=None, prefix="walkindublin:", errors=()):
+        self.client = client
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.prefix = prefix
+        # client exceptions (e.g. redis.RedisError) that mean Redis is unavailable:
+        # lookups that raise them are misses, and stores are dropped
+        self.errors = errors
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.client.dbsize()
+
+    def get(self, key):
+        try:
+            value = self.client.get(self.prefix + key)
+        except self.errors:
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if len(value) <= self.max_bytes:
+            try:
+                self.client.set(self.prefix + key, value, ex=self.ttl)
+            except self.errors:
+                pass
+
+    def clear(self):
+        """ Empty the whole database, as `fab bust` does """
+        self.client.flushdb()
+
+
+class FakeRedis(object):
+    """
+    In-process stand-in for the parts of a redis.Redis client that RedisCache uses
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._items.get(key, (None, None))
+            if expires is not None and expires < time.time():
+                del self._items[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._items[key] = (value, time.time() + ex if ex else None)
+
+    def flushdb(self):
+        with self._lock:
+            self._items.clear()
+
+    def dbsize(self):
+        return len(self._items)
+
+
+def make_cache(config, namespace=None):
+    """
+    Build the response cache described by the app config: CACHE_BACKEND, CACHE_MAX_BYTES,
+    CACHE_TTL, and for Redis, REDIS_URL. Redis keys are prefixed with namespace, if it's
+    given, so entries written for a different graph or response format (which outlive
+    the processes that wrote them) are never read
+    """
+    backend = config["CACHE_BACKEND"]
+    if backend is None:
+        return None
+    if backend == "memory":
+        return LRUCache(config["CACHE_MAX_BYTES"], ttl=config["CACHE_TTL"])
+    errors = ()
+    if backend == "redis":
+        import redis
+
+        client = redis.Redis.from_url(config["REDIS_URL"])
+        errors = (redis.RedisError,)
+    elif backend == "fake":
+        client = FakeRedis()
+    else:
+        raise ValueError("Unknown cache backend: %s" % backend)
+    prefix = "walkindublin:" + (namespace + ":" if namespace else "")
+    return RedisCache(
+        client,
+        config["CACHE_MAX_BYTES"],
+        ttl=config["CACHE_TTL"],
+        prefix=prefix,
+        errors=errors,
+    )
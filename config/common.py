@@ -4,3 +4,53 @@ reloader = False
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 # Generate your own secret key
 SECRET_KEY = "foo"
+# memory-mapped graph snapshot, built from dublin.graphml by `fab snapshot`
+GRAPH_SNAPSHOT = "data/dublin.snapshot"
+# /streets returns the streets within this many metres of the start point, unless
+# it's asked for a list of "distances" (or "minutes", at WALKING_SPEED metres per
+# minute), up to STREETS_MAX_BANDS of them, each at most STREETS_MAX_DISTANCE
+STREETS_DISTANCE = 2000
+STREETS_MAX_DISTANCE = 5000
+STREETS_MAX_BANDS = 10
+WALKING_SPEED = 80
+# cut the streets that are only partly within walking distance where the walk runs
+# out, rather than leaving them out
+STREETS_CUT_EDGES = True
+# /streets requests with "shape": "polygon" get the outline of the walkable area: a
+# concave hull of the streets' vertices, keeping Delaunay triangles with circumradius
+# up to POLYGON_ALPHA metres, buffered by POLYGON_BUFFER metres
+POLYGON_ALPHA = 150
+POLYGON_BUFFER = 25
+# /streets requests from nodes in the HOT_ZONES (lat, lon, radius in metres) are
+# answered from a table of isochrones out to HOT_ZONE_DISTANCE, built by `fab snapshot`;
+# None builds it for every node
+HOT_ZONES = [(53.3472, -6.2590, 1000)]
+HOT_ZONE_DISTANCE = 2000
+# streamed /streets responses are sent this many edges at a time
+STREAM_CHUNK_EDGES = 1000
+# finished /streets and /route responses are cached in CACHE_BACKEND: "memory" (per
+# worker process), "redis" (at REDIS_URL, emptied by `fab bust`), "fake" (an
+# in-process stand-in for Redis), or None. Entries expire after CACHE_TTL seconds
+# (None to keep them), and the memory backend holds at most CACHE_MAX_BYTES
+CACHE_BACKEND = "memory"
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_TTL = 24 * 60 * 60
+REDIS_URL = "redis://localhost:6379/0"
+# GeoJSON coordinates are rounded to this many decimal places (6 is about 0.1 m), or
+# None to send them at full precision
+GEOJSON_PRECISION = 6
+# the same, for clients that ask for polylines
+POLYLINE_PRECISION = 5
+# geometry simplification tiers, in metres: requests that give a map "zoom" or a
+# "tolerance" get the coarsest tier that's within it (0 is full resolution)
+SIMPLIFY_TOLERANCES = (0, 1, 2, 5, 10, 20)
+# /tiles serves vector tiles of the street graph at these zoom levels
+TILES_MIN_ZOOM = 11
+TILES_MAX_ZOOM = 20
+# length of generated walks, in km
+ROUTE_LENGTH = 4
+# /routes returns ROUTES_DEFAULT walks unless it's asked for n of them (up to
+# ROUTES_MAX), generated in parallel on a pool of ROUTE_POOL_SIZE processes
+ROUTES_DEFAULT = 3
+ROUTES_MAX = 8
+ROUTE_POOL_SIZE = 4
@@ -1,37 +1,41 @@
+import math
 import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
 from flask import Flask
 from flask import render_template
-from flask import jsonify, request
-import json
+from flask import jsonify, request, abort, g
+from functools import lru_cache
+import numpy as np
 
 import logging
 
-# OSMnx config
-import osmnx as ox
-from osmnx.geo_utils import add_edge_bearings
-
-ox.config(use_cache=True)
-import geopandas as gpd
-from shapely.geometry import Point, LineString, Polygon
-
-# pyproj config
-from pyproj import CRS
-
-crs = CRS.from_epsg(4326)
-utm = CRS.from_epsg(32629)
-
-# this file includes edge lengths as the 'length' property
-# ox assumes a "data" directory in which this file is located tsk tsk
-G = ox.load_graphml("dublin.graphml")
-# G = add_edge_bearings(G)
-# G_projected = ox.project_graph(G)
-full_graph_gdf = ox.save_load.graph_to_gdfs(G, nodes=False, fill_edge_geometry=True)
-
-from walk_limits import truncate
-from route_utils import generate_route
-
-# TODO: incoming lon, lat coords must be projected to correct UTM (EPSG:32629)
-# TODO: build Point from projected point coords
+import graph_snapshot
+import hotzones
+import landmarks
+from cache import make_cache, make_key
+from metrics import Registry, Timings
+from serialise import (
+    dumps,
+    edge_features,
+    edge_polylines,
+    feature_lines,
+    polygon_features,
+)
+from tiles import EXTENT, TileIndex, encode_tile, tile_bounds
+from tiles import load as load_tile_index
+from walk_limits import (
+    isochrone_cut,
+    isochrone_distances,
+    isochrone_polygons,
+    reachable_edges,
+)
+import route_utils
+from route_utils import generate_route, generate_routes
 
 app = Flask(__name__)
 
@@ -63,6 +67,113 @@ Time:               %(asctime)s
     stream_handler.setFormatter(log_format)
     app.logger.addHandler(stream_handler)
 
+# the snapshot is built from dublin.graphml (which includes edge lengths as the
+# 'length' property) by `fab snapshot`. It's memory-mapped, not parsed.
+# Under gunicorn.conf.py the master process has already loaded it into shared
+# memory, and workers attach to that rather than mapping their own
+if os.getenv("GRAPH_SHARED_MEMORY"):
+    snapshot = graph_snapshot.attach(os.getenv("GRAPH_SHARED_MEMORY"))
+else:
+    snapshot = graph_snapshot.load(app.config["GRAPH_SNAPSHOT"])
+
+# finished /streets and /route responses, keyed by snapped start node and the
+# request's parameters. A shared cache outlives snapshot rebuilds, which renumber the
+# nodes, and deploys, so its keys are namespaced by the snapshot and by
+# RESPONSE_VERSION, which should be bumped whenever a response's content changes
+RESPONSE_VERSION = 1
+response_cache = make_cache(
+    app.config, namespace=make_key("v%d" % RESPONSE_VERSION, snapshot.build_id)
+)
+
+# per-stage timings of every request, served by /metrics, and combined across
+# gunicorn's workers through METRICS_DIR if it's set (see gunicorn.conf.py)
+request_metrics = Registry(directory=os.getenv("METRICS_DIR"))
+if response_cache is not None:
+    request_metrics.report(
+        "cache_hits_total",
+        "counter",
+        "Responses served from the cache",
+        lambda: response_cache.hits,
+    )
+    request_metrics.report(
+        "cache_misses_total",
+        "counter",
+        "Cache lookups that missed",
+        lambda: response_cache.misses,
+    )
+
+# shortest paths for /path, and the way home for /route, bounded by the landmark
+# tables that `fab snapshot` builds alongside the snapshot if they're there
+try:
+    router = landmarks.load(snapshot, app.config["GRAPH_SNAPSHOT"])
+except IOError as e:
+    app.logger.warning(str(e))
+    router = landmarks.Router(snapshot)
+
+# precomputed isochrones for the busiest /streets start nodes, if they've been built
+try:
+    hot_zones = hotzones.load(snapshot, app.config["GRAPH_SNAPSHOT"])
+except IOError as e:
+    app.logger.warning(str(e))
+    hot_zones = None
+
+# which edges cross each map tile, for /tiles, memory-mapped from the snapshot if
+# `fab snapshot` has built it there
+try:
+    tile_index = load_tile_index(snapshot, app.config["GRAPH_SNAPSHOT"])
+except IOError as e:
+    app.logger.warning(str(e))
+    tile_index = TileIndex(snapshot)
+
+# process pool for /routes, started on first use so it isn't forked from the master
+route_pool = None
+route_pool_lock = threading.Lock()
+
+
+def get_route_pool():
+    global route_pool
+    with route_pool_lock:
+        if route_pool is None:
+            route_pool = ProcessPoolExecutor(
+                max_workers=app.config["ROUTE_POOL_SIZE"],
+                mp_context=get_context("spawn"),
+                initializer=route_utils.init_pool,
+                initargs=(
+                    os.getenv("GRAPH_SHARED_MEMORY"),
+                    app.config["GRAPH_SNAPSHOT"],
+                ),
+            )
+        return route_pool
+
+
+def reset_route_pool(pool):
+    """ Throw away a broken route pool, so that get_route_pool starts a new one """
+    global route_pool
+    with route_pool_lock:
+        if route_pool is pool:
+            route_pool = None
+    pool.shutdown(wait=False)
+
+
+def pool_routes(*args, **kwargs):
+    """
+    generate_routes on the route pool. A pool whose worker has died (killed for using
+    too much memory, say) stays broken, so it's replaced and the routes tried once more
+    """
+    for retry in (True, False):
+        pool = get_route_pool()
+        timings = Timings()
+        try:
+            routes = generate_routes(*args, pool=pool, timings=timings, **kwargs)
+        except BrokenProcessPool:
+            reset_route_pool(pool)
+            if not retry:
+                raise
+            app.logger.warning("The route pool broke: starting a new one")
+            continue
+        g.timings.update(timings)
+        return routes
+
 
 class InvalidUsage(Exception):
     status_code = 400
@@ -105,6 +216,38 @@ def app_error(e):
     return render_template("500.html"), 500
 
 
+@app.before_request
+def start_timings():
+    g.timings = Timings()
+    g.start_time = time.perf_counter()
+
+
+@app.after_request
+def record_timings(response):
+    """
+    Send a request's stage timings back in its Server-Timing header, and add them to
+    /metrics. A streamed response's total doesn't include the streaming
+    """
+    if "timings" not in g or request.endpoint in (None, "static", "metrics"):
+        return response
+    total = time.perf_counter() - g.start_time
+    response.headers["Server-Timing"] = g.timings.server_timing(total)
+    request_metrics.observe(request.endpoint, response.status_code, total, g.timings)
+    return response
+
+
+def stage(name):
+    """ Time the body of a with block as stage name of the current request """
+    return g.timings.stage(name)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return app.response_class(
+        response=request_metrics.render(), mimetype="text/plain; version=0.0.4"
+    )
+
+
 @app.route("/")
 def index():
     return render_template("index.jinja")
@@ -115,11 +258,43 @@ def images(filename):
     return app.send_static_file("%s.png" % filename)
 
 
+def walk_thresholds(js):
+    """
+    The distance bands requested by a /streets call, in metres: either "distances"
+    (in metres) or "minutes" (of walking), defaulting to STREETS_DISTANCE
+    """
+    if "minutes" in js:
+        thresholds = js["minutes"]
+        scale = app.config["WALKING_SPEED"]
+    else:
+        thresholds = js.get("distances", [app.config["STREETS_DISTANCE"]])
+        scale = 1
+    try:
+        thresholds = tuple(sorted(set(float(t) * scale for t in thresholds)))
+    except (TypeError, ValueError):
+        raise InvalidUsage("Distances must be a list of numbers", status_code=400)
+    # float() accepts "nan" and "inf", which would slip past the range checks below
+    if not all(math.isfinite(t) for t in thresholds):
+        raise InvalidUsage("Distances must be a list of numbers", status_code=400)
+    if (
+        not thresholds
+        or len(thresholds) > app.config["STREETS_MAX_BANDS"]
+        or thresholds[0] <= 0
+        or thresholds[-1] > app.config["STREETS_MAX_DISTANCE"]
+    ):
+        raise InvalidUsage(
+            "You can ask for up to %s distances, of up to %s metres"
+            % (app.config["STREETS_MAX_BANDS"], app.config["STREETS_MAX_DISTANCE"]),
+            status_code=400,
+        )
+    return thresholds
+
+
 @app.route("/streets", methods=["POST"])
 def streets():
     js = request.get_json(force=True)
     # first, ensure we're within bounds
-    tb = full_graph_gdf.total_bounds
+    tb = snapshot.total_bounds
     if (
         js.get("lon", -6.4) < tb[0]
         or js.get("lon", -6.0) > tb[2]
@@ -129,26 +304,230 @@ def streets():
         raise InvalidUsage("Are you sure you're in Dublin?", status_code=400)
     # calculate street network
     if js.get("lat", None) and js.get("lon", None):
-        gdf_t = truncate(G, (js["lat"], js["lon"]))
-        resp = [
-            gdf_t.__geo_interface__,
-            list(gdf_t.total_bounds),
-        ]
-        response = app.response_class(
-            response=json.dumps(resp), mimetype="application/json"
+        thresholds = walk_thresholds(js)
+        with stage("snap"):
+            centre_node = int(snapshot.nearest_nodes(js["lat"], js["lon"])[0])
+        shape = js.get("shape", "lines")
+        if shape not in ("lines", "polygon"):
+            raise InvalidUsage(
+                'The shape must be "lines" or "polygon"', status_code=400
+            )
+        if shape == "polygon":
+            # the outline of the walkable area for each band, rather than its streets
+            cache_key = make_key("streets", "polygon", centre_node, *thresholds)
+            body = cached(cache_key)
+            if body is None:
+                count_search(centre_node, max(thresholds))
+                with stage("isochrone"):
+                    bands, polygons = isochrone_polygons(
+                        snapshot,
+                        centre_node,
+                        thresholds,
+                        app.config["POLYGON_ALPHA"],
+                        app.config["POLYGON_BUFFER"],
+                        table=hot_zones,
+                    )
+                with stage("serialise"):
+                    body = dumps(
+                        polygon_features(
+                            polygons,
+                            {"band": bands},
+                            precision=app.config["GEOJSON_PRECISION"],
+                        )
+                    )
+                store(cache_key, body)
+            return edges_response(body, "geojson")
+        fmt = response_format(("geojson", "polyline", "ndjson"))
+        tolerance = simplify_tolerance(js)
+        if fmt == "ndjson":
+            # streamed a chunk at a time, so it's neither held in memory nor cached
+            with stage("isochrone"):
+                edges, distances, bands, cuts = street_lines(centre_node, thresholds)
+            lines = feature_lines(
+                snapshot,
+                edges,
+                {"band": bands, "distance": np.round(distances, 1)},
+                chunk_size=app.config["STREAM_CHUNK_EDGES"],
+                cuts=cuts,
+                precision=app.config["GEOJSON_PRECISION"],
+                tolerance=tolerance,
+            )
+            return edges_response(lines, fmt)
+        cache_key = make_key(
+            "streets",
+            fmt,
+            "cut" if app.config["STREETS_CUT_EDGES"] else "whole",
+            tolerance,
+            centre_node,
+            *thresholds
         )
-        return response
+        body = cached(cache_key)
+        if body is None:
+            with stage("isochrone"):
+                edges, _, bands, cuts = street_lines(centre_node, thresholds)
+            with stage("serialise"):
+                body = dumps(
+                    encode_edges(
+                        edges,
+                        fmt,
+                        tolerance,
+                        properties={"band": bands},
+                        cuts=cuts,
+                    )
+                )
+            store(cache_key, body)
+        return edges_response(body, fmt)
     else:
         raise InvalidUsage(
             "Something went wrong with your coordinates", status_code=400
         )
 
 
+def street_lines(centre_node, thresholds):
+    """
+    The streets within walking distance of a node, nearest first, with their distances
+    and bands, and the (start, end) stretch of each to draw (or None, for all of them).
+    If STREETS_CUT_EDGES is set, the streets that are only partly within reach are cut
+    where the walk runs out (see walk_limits.isochrone_cut); otherwise they're left out
+    """
+    count_search(centre_node, max(thresholds))
+    if app.config["STREETS_CUT_EDGES"]:
+        edges, distances, bands, start, end = isochrone_cut(
+            snapshot, centre_node, thresholds, table=hot_zones
+        )
+        return edges, distances, bands, (start, end)
+    edges, distances, bands = isochrone_distances(
+        snapshot, centre_node, thresholds, table=hot_zones
+    )
+    return edges, distances, bands, None
+
+
+def count_search(centre_node, distance):
+    """
+    Count whether an isochrone out to distance will be read from the hot zone table or
+    found with a Dijkstra
+    """
+    if hot_zones is not None and hot_zones.reached(centre_node, distance) is not None:
+        g.timings.count("hot_zone_hits")
+    else:
+        g.timings.count("dijkstra_calls")
+
+
+def cached(key):
+    """ The cached response body for key, or None """
+    if response_cache is None:
+        return None
+    return response_cache.get(key)
+
+
+def store(key, body):
+    """ Cache a response body under key """
+    if response_cache is not None:
+        response_cache.set(key, body)
+
+
+# clients that send POLYLINE_MIMETYPE in their Accept header get edges as encoded
+# polylines (see serialise.edge_polylines) rather than GeoJSON, and /streets clients
+# that send NDJSON_MIMETYPE get a stream of GeoJSON features, nearest first
+POLYLINE_MIMETYPE = "application/vnd.walkindublin.polyline+json"
+NDJSON_MIMETYPE = "application/x-ndjson"
+MIMETYPES = {
+    "geojson": "application/json",
+    "polyline": POLYLINE_MIMETYPE,
+    "ndjson": NDJSON_MIMETYPE,
+}
+
+
+def response_format(formats=("geojson", "polyline")):
+    """ Whichever of formats the client prefers, defaulting to the first """
+    best = request.accept_mimetypes.best_match([MIMETYPES[fmt] for fmt in formats])
+    return next((fmt for fmt in formats if MIMETYPES[fmt] == best), formats[0])
+
+
+def simplify_tolerance(js):
+    """
+    The geometry simplification for a request, in metres: the largest of
+    SIMPLIFY_TOLERANCES that's no bigger than the "tolerance" it asked for, or than
+    half a pixel at the map "zoom" it gave. Full resolution if it gave neither
+    """
+    try:
+        if "tolerance" in js:
+            tolerance = float(js["tolerance"])
+        elif "zoom" in js:
+            zoom = float(js["zoom"])
+            if not math.isfinite(zoom):
+                raise ValueError(zoom)
+            # Mapbox GL zoom levels are for 512 pixel tiles, and go from 0 to 24
+            zoom = min(max(zoom, 0), 24)
+            metres_per_pixel = 78271.517 * np.cos(np.radians(js["lat"])) / 2 ** zoom
+            tolerance = metres_per_pixel / 2
+        else:
+            return 0
+    except (TypeError, ValueError):
+        raise InvalidUsage("Zoom and tolerance must be numbers", status_code=400)
+    return tolerance_tier(tolerance)
+
+
+def tolerance_tier(tolerance):
+    """ The largest of SIMPLIFY_TOLERANCES that's no bigger than tolerance """
+    return max([0] + [t for t in app.config["SIMPLIFY_TOLERANCES"] if t <= tolerance])
+
+
+def encode_edges(edges, fmt, tolerance=0, properties=None, cuts=None):
+    """
+    The [geometries, bounds] response for some edges, in the given format, simplified
+    to tolerance metres, and cut to the (start, end) stretches given, if any
+    """
+    if fmt == "polyline":
+        return edge_polylines(
+            snapshot,
+            edges,
+            properties,
+            precision=app.config["POLYLINE_PRECISION"],
+            tolerance=tolerance,
+            cuts=cuts,
+        )
+    return edge_features(
+        snapshot,
+        edges,
+        properties,
+        precision=app.config["GEOJSON_PRECISION"],
+        tolerance=tolerance,
+        cuts=cuts,
+    )
+
+
+def edges_response(body, fmt):
+    response = app.response_class(response=body, mimetype=MIMETYPES[fmt])
+    response.vary.add("Accept")
+    return response
+
+
+def route_seed(js):
+    """
+    The seed for a /route or /routes call: the one it asked for, so that it gets the
+    same walk as before, or a new one. It's sent back in the X-Route-Seed header
+    """
+    seed = js.get("seed")
+    if seed is None:
+        return secrets.randbits(64)
+    if not isinstance(seed, int) or isinstance(seed, bool) or seed < 0:
+        raise InvalidUsage("The seed must be a non-negative integer", status_code=400)
+    return seed
+
+
+def route_edges(route_nodes):
+    """ The ids of a route's edges, given its node positions """
+    route_nodes = np.array(route_nodes)
+    index = snapshot.edge_ids(route_nodes[:-1], route_nodes[1:])
+    return index[index >= 0]
+
+
 @app.route("/route", methods=["POST"])
 def route():
     js = request.get_json(force=True)
     # first, ensure we're within bounds
-    tb = full_graph_gdf.total_bounds
+    tb = snapshot.total_bounds
     if (
         js.get("lon", -6.4) < tb[0]
         or js.get("lon", -6.0) > tb[2]
@@ -158,24 +537,36 @@ def route():
         raise InvalidUsage("Are you sure you're in Dublin?", status_code=400)
     # calculate a route
     if js.get("lat", None) and js.get("lon", None):
-        route_nodes = generate_route(js["lat"], js["lon"], 4, graph=G)
-        route_nodes = list(zip(route_nodes[:-1], route_nodes[1:]))
-        index = [
-            full_graph_gdf[
-                (full_graph_gdf["u"] == u) & (full_graph_gdf["v"] == v)
-            ].index[0]
-            for u, v in route_nodes
-        ]
-        # gdf_route_edges = full_graph_gdf.loc[index]
-        # we'd ordinarily just call to_json, but since we need to send the bounds too
-        # we have to manually build the json from a list containing both
-        resp = [
-            full_graph_gdf.loc[index].geometry.__geo_interface__,
-            list(full_graph_gdf.loc[index].total_bounds),
-        ]
-        response = app.response_class(
-            response=json.dumps(resp), mimetype="application/json"
+        seed = route_seed(js)
+        with stage("snap"):
+            start_node = int(snapshot.nearest_nodes(js["lat"], js["lon"])[0])
+        # a walk is only worth caching if its seed came from the client: a fresh
+        # random seed won't be asked for again
+        fmt = response_format()
+        tolerance = simplify_tolerance(js)
+        cache_key = make_key(
+            "route", fmt, tolerance, start_node, app.config["ROUTE_LENGTH"], seed
         )
+        body = cached(cache_key) if js.get("seed") is not None else None
+        if body is None:
+            route_nodes = generate_route(
+                js["lat"],
+                js["lon"],
+                app.config["ROUTE_LENGTH"],
+                graph=snapshot,
+                start_node=start_node,
+                seed=seed,
+                router=router,
+                timings=g.timings,
+            )
+            with stage("edges"):
+                edges = route_edges(route_nodes)
+            with stage("serialise"):
+                body = dumps(encode_edges(edges, fmt, tolerance))
+            if js.get("seed") is not None:
+                store(cache_key, body)
+        response = edges_response(body, fmt)
+        response.headers["X-Route-Seed"] = str(seed)
         return response
     else:
         raise InvalidUsage(
@@ -183,5 +574,172 @@ def route():
         )
 
 
+@app.route("/routes", methods=["POST"])
+def routes():
+    js = request.get_json(force=True)
+    # first, ensure we're within bounds
+    tb = snapshot.total_bounds
+    if (
+        js.get("lon", -6.4) < tb[0]
+        or js.get("lon", -6.0) > tb[2]
+        or js.get("lat", 53.32) < tb[1]
+        or js.get("lat", 53.45) > tb[3]
+    ):
+        raise InvalidUsage("Are you sure you're in Dublin?", status_code=400)
+    n = js.get("n", app.config["ROUTES_DEFAULT"])
+    if (
+        not isinstance(n, int)
+        or isinstance(n, bool)
+        or not 0 < n <= app.config["ROUTES_MAX"]
+    ):
+        raise InvalidUsage(
+            "You can ask for up to %s routes" % app.config["ROUTES_MAX"],
+            status_code=400,
+        )
+    # calculate n routes, best first
+    if js.get("lat", None) and js.get("lon", None):
+        seed = route_seed(js)
+        with stage("snap"):
+            start_node = int(snapshot.nearest_nodes(js["lat"], js["lon"])[0])
+        route_list = pool_routes(
+            js["lat"],
+            js["lon"],
+            app.config["ROUTE_LENGTH"],
+            n,
+            graph=snapshot,
+            start_node=start_node,
+            seed=seed,
+        )
+        fmt = response_format()
+        tolerance = simplify_tolerance(js)
+        with stage("edges"):
+            edge_lists = [route_edges(route_nodes) for route_nodes in route_list]
+        with stage("serialise"):
+            body = dumps([encode_edges(edges, fmt, tolerance) for edges in edge_lists])
+        response = edges_response(body, fmt)
+        response.headers["X-Route-Seed"] = str(seed)
+        return response
+    else:
+        raise InvalidUsage(
+            "Something went wrong with your coordinates", status_code=400
+        )
+
+
+@app.route("/path", methods=["POST"])
+def path():
+    js = request.get_json(force=True)
+    # first, ensure both ends are within bounds
+    tb = snapshot.total_bounds
+    for lat, lon in (("lat", "lon"), ("to_lat", "to_lon")):
+        if (
+            js.get(lon, -6.4) < tb[0]
+            or js.get(lon, -6.0) > tb[2]
+            or js.get(lat, 53.32) < tb[1]
+            or js.get(lat, 53.45) > tb[3]
+        ):
+            raise InvalidUsage("Are you sure you're in Dublin?", status_code=400)
+    # find the shortest walk between them
+    if all(js.get(key, None) for key in ("lat", "lon", "to_lat", "to_lon")):
+        with stage("snap"):
+            source, target = snapshot.nearest_nodes(
+                [js["lat"], js["to_lat"]], [js["lon"], js["to_lon"]]
+            ).tolist()
+        fmt = response_format()
+        tolerance = simplify_tolerance(js)
+        cache_key = make_key("path", fmt, tolerance, source, target)
+        body = cached(cache_key)
+        if body is None:
+            with stage("path"):
+                length, path_nodes = router.path(source, target, g.timings)
+            if not path_nodes:
+                raise InvalidUsage(
+                    "There's no walking route between those points", status_code=400
+                )
+            with stage("edges"):
+                edges = route_edges(path_nodes)
+            with stage("serialise"):
+                body = dumps(encode_edges(edges, fmt, tolerance))
+            store(cache_key, body)
+        return edges_response(body, fmt)
+    else:
+        raise InvalidUsage(
+            "Something went wrong with your coordinates", status_code=400
+        )
+
+
+@lru_cache(maxsize=32)
+def node_distances(centre_node, distance):
+    """
+    Walking distance from a node to every other, out to distance metres. A map view
+    fetches several tiles for the same start point, so this is shared between them
+    """
+    g.timings.count("dijkstra_calls")
+    _, distances = reachable_edges(snapshot, centre_node, distance)
+    distances.flags.writeable = False
+    return distances
+
+
+@app.route("/tiles/<int:z>/<int:x>/<int:y>.mvt", methods=["GET"])
+def tiles(z, x, y):
+    if (
+        not app.config["TILES_MIN_ZOOM"] <= z <= app.config["TILES_MAX_ZOOM"]
+        or not 0 <= x < 2 ** z
+        or not 0 <= y < 2 ** z
+    ):
+        abort(404)
+    # if a start point is given, reachable streets are tagged with their distance
+    centre_node = None
+    distance = None
+    if "lat" in request.args or "lon" in request.args:
+        lat = request.args.get("lat", type=float)
+        lon = request.args.get("lon", type=float)
+        # type=float would quietly fall back to the default if it didn't parse
+        try:
+            distance = float(
+                request.args.get("distance", app.config["STREETS_DISTANCE"])
+            )
+        except ValueError:
+            distance = None
+        tb = snapshot.total_bounds
+        if (
+            lat is None
+            or lon is None
+            or distance is None
+            # "nan" parses as a float, and fails every bounds comparison
+            or not all(math.isfinite(value) for value in (lat, lon, distance))
+        ):
+            raise InvalidUsage(
+                "Something went wrong with your coordinates", status_code=400
+            )
+        if lon < tb[0] or lon > tb[2] or lat < tb[1] or lat > tb[3]:
+            raise InvalidUsage("Are you sure you're in Dublin?", status_code=400)
+        if not 0 < distance <= app.config["STREETS_MAX_DISTANCE"]:
+            raise InvalidUsage(
+                "The distance can be at most %s metres"
+                % app.config["STREETS_MAX_DISTANCE"],
+                status_code=400,
+            )
+        with stage("snap"):
+            centre_node = int(snapshot.nearest_nodes(lat, lon)[0])
+    cache_key = make_key("tile", z, x, y, centre_node, distance)
+    body = cached(cache_key)
+    if body is None:
+        # one tile extent unit is the finest detail a tile can show
+        _, south, _, north = tile_bounds(z, x, y)
+        unit = 40075016.686 * np.cos(np.radians((south + north) / 2)) / 2 ** z / EXTENT
+        distances = None
+        if centre_node is not None:
+            with stage("isochrone"):
+                distances = node_distances(centre_node, distance)
+        with stage("serialise"):
+            body = encode_tile(
+                snapshot, tile_index, z, x, y, distances, tolerance=tolerance_tier(unit)
+            )
+        store(cache_key, body)
+    return app.response_class(
+        response=body, mimetype="application/vnd.mapbox-vector-tile"
+    )
+
+
 if __name__ == "__main__":
     app.run()
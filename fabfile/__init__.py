@@ -36,6 +36,18 @@ def reload():
             sudo("systemctl restart nginx")
 
 
+@task
+def snapshot():
+    """ Rebuild the remote graph snapshot and its lookup tables, and restart """
+    with cd("/var/www/walkindublin"):
+        with hide("output"):
+            run("venv/bin/python graph_snapshot.py dublin.graphml data/dublin.snapshot")
+            run("venv/bin/python landmarks.py data/dublin.snapshot")
+            run("venv/bin/python hotzones.py data/dublin.snapshot")
+            run("venv/bin/python tiles.py data/dublin.snapshot")
+            sudo("systemctl restart walkindublin")
+
+
 @task
 def bust(db=0):
     """ Bust the remote Redis cache """
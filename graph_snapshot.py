@@ -0,0 +1,716 @@
+"""
+A compact, memory-mappable snapshot of the street graph.
+
+Parsing dublin.graphml and building a GeoDataFrame from it takes tens of seconds,
+and every worker used to pay that on startup. The snapshot is built once from the
+graphml and stored as a directory of .npy files, which are memory-mapped when
+loaded, so opening it costs next to nothing.
+
+Nodes are addressed by their position in `node_ids` (which is sorted), and edges
+by their position in the edge arrays, which are sorted by (u, v, key), so
+`indptr` is a CSR index of each node's out-edges.
+
+Each geometry vertex also has a Douglas-Peucker significance, in metres: simplifying
+its edge with any tolerance below that keeps it, so edge_coords can return the
+geometries simplified to any tolerance without recomputing anything.
+
+The indexes built from those (DERIVED_ARRAYS: the edge lookup keys, the csgraph
+adjacency matrices, the dead-end table and a grid index of the nodes for snapping) are
+computed when the snapshot is built and stored alongside it, so that processes that
+load() or attach() it share them too, rather than each building its own.
+
+Build a snapshot with:
+
+    python graph_snapshot.py [dublin.graphml] [data/dublin.snapshot]
+"""
+
+import hashlib
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+from pyproj import Transformer
+from scipy.sparse import csr_matrix
+
+SNAPSHOT_VERSION = 3
+
+ARRAYS = (
+    # node positions -> OSM id, and WGS84 coordinates
+    "node_ids",
+    "node_x",
+    "node_y",
+    # CSR index: out-edges of node i are edges indptr[i]:indptr[i + 1]
+    "indptr",
+    # per-edge start / end node positions, multigraph key, and attributes
+    "edge_u",
+    "edge_v",
+    "edge_key",
+    "edge_length",
+    "edge_bearing",
+    # packed edge geometries: the (lon, lat) vertices of edge i are
+    # geom_coords[geom_offsets[i]:geom_offsets[i + 1]]
+    "geom_offsets",
+    "geom_coords",
+    # Douglas-Peucker significance of each vertex, in metres; inf at edge ends
+    "geom_significance",
+)
+
+DERIVED_ARRAYS = (
+    # (u * n_nodes + v) * key_span + key for each edge: sorted, like the edges
+    "edge_index",
+    # node-to-node adjacency matrix for scipy.sparse.csgraph, weighted by length, and
+    # its transpose, as CSR (data, indices, indptr)
+    "csgraph_data",
+    "csgraph_indices",
+    "csgraph_indptr",
+    "reverse_data",
+    "reverse_indices",
+    "reverse_indptr",
+    # the number of distinct neighbours of each node, ignoring edge direction; nodes
+    # with only one are dead ends
+    "neighbour_count",
+    "dead_end",
+    # node coordinates in the graph's UTM zone, and a grid index of them: the nodes in
+    # cell i (numbered row by row, see meta["grid"]) are
+    # grid_nodes[grid_indptr[i]:grid_indptr[i + 1]]
+    "node_px",
+    "node_py",
+    "grid_nodes",
+    "grid_indptr",
+)
+
+# size of the snapping grid's cells, in metres
+GRID_CELL = 100.0
+
+
+def bearings(lat1, lon1, lat2, lon2):
+    """
+    Vectorised version of osmnx.geo_utils.get_bearing.
+    Parameters
+    ----------
+    lat1, lon1 : float or numpy array
+        origin point(s), in degrees
+    lat2, lon2 : float or numpy array
+        destination point(s), in degrees
+    Returns
+    -------
+    bearing : float or numpy array
+        compass bearing(s) in degrees, from 0 to 360
+    """
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    diff_lng = np.radians(np.subtract(lon2, lon1))
+    x = np.sin(diff_lng) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(diff_lng)
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+class GraphSnapshot(object):
+    """
+    Read-only array view of a street graph. See the module docstring for the layout.
+    """
+
+    def __init__(self, arrays, meta):
+        # the graph is shared between threads (and between processes, if it's been
+        # share()d), so it's strictly read-only
+        for name in ARRAYS + DERIVED_ARRAYS:
+            arrays[name].flags.writeable = False
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self._key_span = meta["key_span"]
+        # nearest-node snapping is done in the UTM zone of the graph's centre
+        self._projection = utm_projection(meta["total_bounds"])
+        # views onto the stored arrays, which csgraph's routines use without copying
+        shape = (self.n_nodes, self.n_nodes)
+        self.csgraph = csr_matrix(
+            (self.csgraph_data, self.csgraph_indices, self.csgraph_indptr),
+            shape=shape,
+            copy=False,
+        )
+        self.reverse_csgraph = csr_matrix(
+            (self.reverse_data, self.reverse_indices, self.reverse_indptr),
+            shape=shape,
+            copy=False,
+        )
+
+    @property
+    def build_id(self):
+        """
+        Fingerprint of the graph's contents (see fingerprint), which changes whenever a
+        rebuild renumbers its nodes or edges. Snapshots built before it was stored in
+        their meta have it computed on first use
+        """
+        if "build_id" not in self.meta:
+            self.meta["build_id"] = fingerprint(
+                {name: getattr(self, name) for name in ARRAYS}
+            )
+        return self.meta["build_id"]
+
+    @property
+    def n_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self):
+        return len(self.edge_u)
+
+    @property
+    def total_bounds(self):
+        """ (minx, miny, maxx, maxy) of all edge geometries """
+        return self.meta["total_bounds"]
+
+    def node_index(self, osmids):
+        """
+        Map OSM node ids to node positions.
+        Raises KeyError if any of the ids aren't in the graph.
+        """
+        osmids = np.asarray(osmids, dtype=np.int64)
+        pos = np.searchsorted(self.node_ids, osmids)
+        pos[pos == self.n_nodes] = 0
+        if not np.array_equal(self.node_ids[pos], osmids):
+            raise KeyError("Unknown node id(s)")
+        return pos
+
+    def nearest_nodes(self, lats, lons):
+        """
+        Snap points to their nearest graph nodes.
+        Parameters
+        ----------
+        lats, lons : float or array of floats
+            WGS84 coordinates of the points
+        Returns
+        -------
+        nodes : numpy array
+            positions of the nearest nodes
+        """
+        x, y = self._projection.transform(
+            np.atleast_1d(lons).astype(np.float64),
+            np.atleast_1d(lats).astype(np.float64),
+        )
+        grid = self.meta["grid"]
+        nodes = np.zeros(len(x), dtype=np.int64)
+        for i, (px, py) in enumerate(zip(x.tolist(), y.tolist())):
+            # search ever bigger blocks of cells around the point's cell, until the
+            # nearest node found is nearer than any node outside the block can be
+            cx, cy = self._cell(px, py)
+            for r in range(max(grid["nx"], grid["ny"])):
+                candidates = self._cell_nodes(cx - r, cx + r, cy - r, cy + r)
+                if len(candidates):
+                    d = np.hypot(
+                        self.node_px[candidates] - px, self.node_py[candidates] - py
+                    )
+                    best = np.argmin(d)
+                    if d[best] <= r * grid["cell"]:
+                        break
+            nodes[i] = candidates[best]
+        return nodes
+
+    def project(self, lons, lats):
+        """ Project WGS84 coordinates into the graph's UTM zone, in metres """
+        return self._projection.transform(lons, lats)
+
+    def unproject(self, x, y):
+        """ The WGS84 coordinates of points projected by project() """
+        return self._projection.transform(x, y, direction="INVERSE")
+
+    def nodes_within(self, lat, lon, radius):
+        """ Positions of the nodes within radius metres of a point, in ascending order """
+        x, y = self.project(lon, lat)
+        x0, y0 = self._cell(x - radius, y - radius)
+        x1, y1 = self._cell(x + radius, y + radius)
+        nodes = self._cell_nodes(x0, x1, y0, y1)
+        within = np.hypot(self.node_px[nodes] - x, self.node_py[nodes] - y) <= radius
+        return np.sort(nodes[within]).astype(np.int64)
+
+    def _cell(self, x, y):
+        """ Grid cell column and row of a projected point, clamped to the grid """
+        grid = self.meta["grid"]
+        cx = int(np.clip((x - grid["x0"]) // grid["cell"], 0, grid["nx"] - 1))
+        cy = int(np.clip((y - grid["y0"]) // grid["cell"], 0, grid["ny"] - 1))
+        return cx, cy
+
+    def _cell_nodes(self, x0, x1, y0, y1):
+        """ Positions of the nodes in a block of grid cells, inclusive """
+        grid = self.meta["grid"]
+        x0, x1 = max(x0, 0), min(x1, grid["nx"] - 1)
+        y0, y1 = max(y0, 0), min(y1, grid["ny"] - 1)
+        # each row of the block is a contiguous run of cells
+        rows = np.arange(y0, y1 + 1) * grid["nx"]
+        starts = self.grid_indptr[rows + x0]
+        ends = self.grid_indptr[rows + x1 + 1]
+        return np.concatenate(
+            [self.grid_nodes[a:b] for a, b in zip(starts.tolist(), ends.tolist())]
+        )
+
+    def edge_ids(self, u, v, key=None):
+        """
+        Vectorised lookup of edge ids from node positions.
+        Parameters
+        ----------
+        u, v : int or array of ints
+            start and end node positions
+        key : int or array of ints
+            multigraph key. If it isn't given, the lowest-keyed u -> v edge is used,
+            falling back to the v -> u edge if there isn't one (to work around one
+            way streets)
+        Returns
+        -------
+        ids : numpy array
+            edge ids, or -1 where there's no such edge
+        """
+        u, v = np.broadcast_arrays(np.asarray(u, dtype=np.int64), v)
+        if key is not None:
+            return self._find_edges(u, v, np.asarray(key, dtype=np.int64), exact=True)
+        ids = self._find_edges(u, v, 0, exact=False)
+        missing = ids == -1
+        if missing.any():
+            ids[missing] = self._find_edges(v[missing], u[missing], 0, exact=False)
+        return ids
+
+    def _find_edges(self, u, v, key, exact):
+        target = np.atleast_1d((u * self.n_nodes + v) * self._key_span + key)
+        pos = np.searchsorted(self.edge_index, target)
+        found = pos < self.n_edges
+        pos[~found] = 0
+        if exact:
+            found &= self.edge_index[pos] == target
+        else:
+            # the first edge at or after (u, v, key) must still be a u -> v edge
+            found &= self.edge_index[pos] // self._key_span == target // self._key_span
+        return np.where(found, pos, -1).reshape(np.shape(u))
+
+    def edge_coords(self, edges, tolerance=None, start=None, end=None):
+        """
+        The (lon, lat) vertices of some edges, packed like geom_offsets and geom_coords:
+        the vertices of edges[i] are coords[offsets[i]:offsets[i + 1]]. If a tolerance
+        (in metres) is given, the geometries are Douglas-Peucker simplified to it. If
+        start and end fractions are given, each edge is then cut down to that stretch
+        of it (see cut_lines).
+        """
+        edges = np.asarray(edges, dtype=np.intp)
+        starts = self.geom_offsets[edges]
+        counts = self.geom_offsets[edges + 1] - starts
+        offsets = np.zeros(len(edges) + 1, dtype=np.intp)
+        np.cumsum(counts, out=offsets[1:])
+        index = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+        if tolerance and len(edges):
+            keep = self.geom_significance[index] > tolerance
+            index = index[keep]
+            np.cumsum(np.add.reduceat(keep, offsets[:-1]), out=offsets[1:])
+        if start is not None:
+            return self.cut_lines(offsets, self.geom_coords[index], start, end)
+        return offsets, self.geom_coords[index]
+
+    def cut_lines(self, offsets, coords, start, end):
+        """
+        Cut packed lines down to a stretch of each, all at once, measuring along them
+        in the graph's projection.
+        Parameters
+        ----------
+        offsets, coords : numpy array
+            the lines, packed as GraphSnapshot.edge_coords returns them
+        start, end : numpy array
+            the stretch of each line to keep, as fractions of its length from its first
+            vertex (0 <= start <= end <= 1)
+        Returns
+        -------
+        offsets, coords : numpy array
+            the cut lines, packed the same way. Each starts and ends at a point
+            interpolated at start and end, with the vertices in between
+        """
+        counts = np.diff(offsets)
+        if not len(counts):
+            return offsets, coords
+        x, y = self.project(coords[:, 0], coords[:, 1])
+        # distance along all the lines, end to end, with a metre's gap between each line
+        # and the next, so every line's stretch of it is distinct
+        steps = np.hypot(np.diff(x, prepend=x[:1]), np.diff(y, prepend=y[:1]))
+        steps[offsets[:-1]] = 1.0
+        along = np.cumsum(steps)
+        first = along[offsets[:-1]]
+        length = along[offsets[1:] - 1] - first
+        a = first + start * length
+        b = first + end * length
+
+        def interpolate(positions):
+            # the segment each position lies on, and how far along it
+            i = np.searchsorted(along, positions, side="right") - 1
+            i = np.clip(i, offsets[:-1], offsets[1:] - 2)
+            span = along[i + 1] - along[i]
+            t = np.divide(
+                positions - along[i], span, out=np.zeros(len(i)), where=span > 0
+            )
+            return coords[i] + t[:, None] * (coords[i + 1] - coords[i])
+
+        inside = (along > np.repeat(a, counts)) & (along < np.repeat(b, counts))
+        kept = np.add.reduceat(inside, offsets[:-1])
+        new_offsets = np.zeros(len(counts) + 1, dtype=np.intp)
+        np.cumsum(kept + 2, out=new_offsets[1:])
+        new_coords = np.empty((new_offsets[-1], 2))
+        new_coords[new_offsets[:-1]] = interpolate(a)
+        new_coords[new_offsets[1:] - 1] = interpolate(b)
+        # vertices in between go after their line's start point, in order
+        rank = np.cumsum(inside) - np.repeat(np.cumsum(kept) - kept, counts)
+        new_coords[np.repeat(new_offsets[:-1], counts)[inside] + rank[inside]] = coords[
+            inside
+        ]
+        return new_offsets, new_coords
+
+
+def utm_projection(total_bounds):
+    """ Transformer from WGS84 to the UTM zone at the centre of total_bounds """
+    minx, miny, maxx, maxy = total_bounds
+    zone = int(((minx + maxx) / 2 + 180) // 6) + 1
+    return Transformer.from_crs("epsg:4326", "epsg:%d" % (32600 + zone), always_xy=True)
+
+
+def significance(x, y):
+    """
+    Douglas-Peucker significance of each vertex of a line: simplifying the line with a
+    tolerance below a vertex's significance keeps the vertex, and with one at or above
+    it drops the vertex.
+    Parameters
+    ----------
+    x, y : numpy array
+        projected vertex coordinates
+    Returns
+    -------
+    significance : numpy array
+        inf for the line's ends
+    """
+    result = np.full(len(x), np.inf)
+    # a vertex survives only if every split above it in the recursion survives, so its
+    # significance is its own distance from the chord, capped by its parent's
+    stack = [(0, len(x) - 1, np.inf)]
+    while stack:
+        first, last, cap = stack.pop()
+        if last - first < 2:
+            continue
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[first + 1 : last] - x[first]
+        py = y[first + 1 : last] - y[first]
+        chord = dx * dx + dy * dy
+        # distance to the chord segment, as shapely's simplify measures it
+        t = np.clip((px * dx + py * dy) / chord, 0, 1) if chord else 0
+        distances = np.hypot(px - t * dx, py - t * dy)
+        split = first + 1 + int(np.argmax(distances))
+        result[split] = min(distances[split - first - 1], cap)
+        stack.append((first, split, result[split]))
+        stack.append((split, last, result[split]))
+    return result
+
+
+def fingerprint(arrays):
+    """ Short hex digest of a snapshot's ARRAYS """
+    digest = hashlib.sha1()
+    for name in ARRAYS:
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def derive(arrays, total_bounds):
+    """
+    Compute a snapshot's DERIVED_ARRAYS from its ARRAYS.
+    Returns
+    -------
+    derived : dict
+        the DERIVED_ARRAYS
+    meta : dict
+        "key_span", and the snapping "grid": its origin ("x0", "y0") and "cell" size in
+        metres, and its "nx" columns and "ny" rows
+    """
+    n_nodes = len(arrays["node_ids"])
+    edge_u = arrays["edge_u"]
+    edge_v = arrays["edge_v"]
+    key_span = int(arrays["edge_key"].max()) + 1 if len(edge_u) else 1
+    # edges are sorted by (u, v, key), so this composite is sorted too, and edge
+    # lookups are a binary search over it
+    edge_index = (edge_u * n_nodes + edge_v) * key_span + arrays["edge_key"]
+    # csgraph doesn't understand parallel edges, so only the shortest is kept
+    first = np.flatnonzero(np.diff(edge_index // key_span, prepend=-1) != 0)
+    adjacency_indptr = np.zeros(n_nodes + 1, dtype=np.int32)
+    np.cumsum(np.bincount(edge_u[first], minlength=n_nodes), out=adjacency_indptr[1:])
+    csgraph = csr_matrix(
+        (
+            np.minimum.reduceat(arrays["edge_length"], first),
+            edge_v[first].astype(np.int32),
+            adjacency_indptr,
+        ),
+        shape=(n_nodes, n_nodes),
+    )
+    reverse = csgraph.transpose().tocsr()
+    u = edge_u[first]
+    v = edge_v[first]
+    pairs = np.unique(np.minimum(u, v) * n_nodes + np.maximum(u, v))
+    a, b = np.divmod(pairs, n_nodes)
+    neighbour_count = np.bincount(a, minlength=n_nodes) + np.bincount(
+        b[a != b], minlength=n_nodes
+    )
+    node_px, node_py = utm_projection(total_bounds).transform(
+        arrays["node_x"], arrays["node_y"]
+    )
+    x0 = float(node_px.min()) if n_nodes else 0.0
+    y0 = float(node_py.min()) if n_nodes else 0.0
+    nx = int((node_px.max() - x0) // GRID_CELL) + 1 if n_nodes else 1
+    ny = int((node_py.max() - y0) // GRID_CELL) + 1 if n_nodes else 1
+    cells = ((node_py - y0) // GRID_CELL).astype(np.int64) * nx + (
+        (node_px - x0) // GRID_CELL
+    ).astype(np.int64)
+    grid_indptr = np.zeros(nx * ny + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells, minlength=nx * ny), out=grid_indptr[1:])
+    derived = {
+        "edge_index": edge_index,
+        "csgraph_data": csgraph.data,
+        "csgraph_indices": csgraph.indices.astype(np.int32),
+        "csgraph_indptr": csgraph.indptr.astype(np.int32),
+        "reverse_data": reverse.data,
+        "reverse_indices": reverse.indices.astype(np.int32),
+        "reverse_indptr": reverse.indptr.astype(np.int32),
+        "neighbour_count": neighbour_count,
+        "dead_end": neighbour_count <= 1,
+        "node_px": node_px,
+        "node_py": node_py,
+        "grid_nodes": np.argsort(cells, kind="stable"),
+        "grid_indptr": grid_indptr,
+    }
+    meta = {
+        "key_span": key_span,
+        "grid": {"x0": x0, "y0": y0, "cell": GRID_CELL, "nx": nx, "ny": ny},
+    }
+    return derived, meta
+
+
+def build(G):
+    """
+    Build a snapshot from an osmnx graph (unprojected, as loaded by load_graphml)
+    Parameters
+    ----------
+    G : networkx multidigraph
+        the street graph
+    Returns
+    -------
+    snapshot : GraphSnapshot
+    """
+    node_ids = np.array(sorted(G.nodes), dtype=np.int64)
+    node_x = np.array([G.nodes[n]["x"] for n in node_ids.tolist()], dtype=np.float64)
+    node_y = np.array([G.nodes[n]["y"] for n in node_ids.tolist()], dtype=np.float64)
+
+    edges = list(G.edges(keys=True, data=True))
+    u = np.searchsorted(node_ids, [e[0] for e in edges])
+    v = np.searchsorted(node_ids, [e[1] for e in edges])
+    key = np.array([e[2] for e in edges], dtype=np.int64)
+    order = np.lexsort((key, v, u))
+    edges = [edges[i] for i in order]
+    edge_u = u[order].astype(np.int64)
+    edge_v = v[order].astype(np.int64)
+    edge_key = key[order]
+
+    edge_length = np.array([float(e[3]["length"]) for e in edges], dtype=np.float64)
+    # bearings are stored as strings in graphml, and may be missing altogether
+    edge_bearing = np.array(
+        [float(e[3].get("bearing", np.nan)) for e in edges], dtype=np.float64
+    )
+    missing = np.isnan(edge_bearing)
+    edge_bearing[missing] = bearings(
+        node_y[edge_u[missing]],
+        node_x[edge_u[missing]],
+        node_y[edge_v[missing]],
+        node_x[edge_v[missing]],
+    )
+
+    # fill missing geometries with a straight line, as fill_edge_geometry does
+    coords = []
+    for e, eu, ev in zip(edges, edge_u, edge_v):
+        if "geometry" in e[3]:
+            coords.append(np.asarray(e[3]["geometry"].coords, dtype=np.float64))
+        else:
+            coords.append(
+                np.array(
+                    [[node_x[eu], node_y[eu]], [node_x[ev], node_y[ev]]],
+                    dtype=np.float64,
+                )
+            )
+    geom_offsets = np.zeros(len(coords) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in coords], out=geom_offsets[1:])
+    geom_coords = np.concatenate(coords)
+    total_bounds = np.concatenate([geom_coords.min(axis=0), geom_coords.max(axis=0)])
+    geom_x, geom_y = utm_projection(total_bounds).transform(
+        geom_coords[:, 0], geom_coords[:, 1]
+    )
+    geom_significance = np.concatenate(
+        [
+            significance(geom_x[start:end], geom_y[start:end])
+            for start, end in zip(geom_offsets[:-1], geom_offsets[1:])
+        ]
+    ).astype(np.float32)
+
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_u, minlength=len(node_ids)), out=indptr[1:])
+
+    arrays = {
+        "node_ids": node_ids,
+        "node_x": node_x,
+        "node_y": node_y,
+        "indptr": indptr,
+        "edge_u": edge_u,
+        "edge_v": edge_v,
+        "edge_key": edge_key,
+        "edge_length": edge_length,
+        "edge_bearing": edge_bearing,
+        "geom_offsets": geom_offsets,
+        "geom_coords": geom_coords,
+        "geom_significance": geom_significance,
+    }
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "name": G.graph.get("name", "unnamed"),
+        "crs": str(G.graph.get("crs", "epsg:4326")),
+        "total_bounds": total_bounds.tolist(),
+        "build_id": fingerprint(arrays),
+    }
+    derived, derived_meta = derive(arrays, total_bounds)
+    arrays.update(derived)
+    meta.update(derived_meta)
+    return GraphSnapshot(arrays, meta)
+
+
+def save(snapshot, path):
+    """ Write a snapshot to the directory at path """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    for name in ARRAYS + DERIVED_ARRAYS:
+        np.save(os.path.join(path, name + ".npy"), getattr(snapshot, name))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(snapshot.meta, f)
+
+
+def load(path):
+    """
+    Memory-map the snapshot in the directory at path
+    """
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except IOError:
+        raise IOError(
+            "No graph snapshot at %s: build one with `python graph_snapshot.py`" % path
+        )
+    if meta["version"] != SNAPSHOT_VERSION:
+        raise IOError(
+            "Graph snapshot at %s is version %s, expected %s: rebuild it"
+            % (path, meta["version"], SNAPSHOT_VERSION)
+        )
+    arrays = {
+        name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+        for name in ARRAYS + DERIVED_ARRAYS
+    }
+    return GraphSnapshot(arrays, meta)
+
+
+def _align(offset, alignment=64):
+    return -(-offset // alignment) * alignment
+
+
+def share(snapshot, name):
+    """
+    Copy a snapshot into a named block of shared memory, which other processes can
+    then attach() to without copying it. The block starts with a length-prefixed JSON
+    header describing the meta and the layout of each array.
+    The caller owns the block, and should close() and unlink() it when done.
+    Parameters
+    ----------
+    snapshot : GraphSnapshot
+    name : string
+        name of the shared memory block
+    Returns
+    -------
+    shm : multiprocessing.shared_memory.SharedMemory
+    """
+    from multiprocessing import shared_memory
+
+    layout = {}
+    size = 0
+    for array_name in ARRAYS + DERIVED_ARRAYS:
+        arr = getattr(snapshot, array_name)
+        size = _align(size)
+        layout[array_name] = [size, arr.dtype.str, list(arr.shape)]
+        size += arr.nbytes
+    # the block is registered with this process's resource tracker, which unlinks it
+    # if this process dies without doing so; attach() needs to know which one that is
+    header = json.dumps(
+        {"meta": snapshot.meta, "arrays": layout, "tracker": _tracker_id()}
+    ).encode("utf-8")
+    start = _align(8 + len(header))
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=start + size)
+    except FileExistsError:
+        # left behind by a master process that didn't exit cleanly
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+        shm = shared_memory.SharedMemory(name=name, create=True, size=start + size)
+    shm.buf[:8] = struct.pack("<Q", len(header))
+    shm.buf[8 : 8 + len(header)] = header
+    for array_name, (offset, dtype, shape) in layout.items():
+        dest = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start + offset)
+        dest[...] = getattr(snapshot, array_name)
+    return shm
+
+
+def _tracker_id():
+    """
+    Identifies this process's multiprocessing resource tracker (starting it if need
+    be): the device and inode of the pipe to it, which processes forked or spawned from
+    this one share
+    """
+    from multiprocessing import resource_tracker
+
+    resource_tracker.ensure_running()
+    stat = os.fstat(resource_tracker._resource_tracker._fd)
+    return "%d:%d" % (stat.st_dev, stat.st_ino)
+
+
+def attach(name):
+    """
+    Attach to a snapshot that another process has share()d. The arrays are
+    read-only views onto the shared block, so nothing is copied.
+    """
+    from multiprocessing import resource_tracker, shared_memory
+
+    try:
+        # Python 3.13+: the block is the creator's to clean up, so don't track it here
+        shm = shared_memory.SharedMemory(name=name, track=False)
+        tracked = False
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        tracked = True
+    (header_length,) = struct.unpack("<Q", shm.buf[:8])
+    header = json.loads(bytes(shm.buf[8 : 8 + header_length]).decode("utf-8"))
+    # A resource tracker of our own would unlink the block when this process exits,
+    # pulling it out from under every other worker (https://bugs.python.org/issue39959).
+    # But processes forked or spawned from the creator share its tracker, and there,
+    # unregistering would drop the creator's own registration
+    if tracked and _tracker_id() != header["tracker"]:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    start = _align(8 + header_length)
+    arrays = {}
+    for array_name, (offset, dtype, shape) in header["arrays"].items():
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start + offset)
+        arr.flags.writeable = False
+        arrays[array_name] = arr
+    snapshot = GraphSnapshot(arrays, header["meta"])
+    # the views are only valid for as long as the block is open
+    snapshot._shm = shm
+    return snapshot
+
+
+if __name__ == "__main__":
+    import osmnx as ox
+
+    graphml = sys.argv[1] if len(sys.argv) > 1 else "dublin.graphml"
+    path = sys.argv[2] if len(sys.argv) > 2 else "data/dublin.snapshot"
+    # ox assumes a "data" directory in which the graphml file is located
+    save(build(ox.load_graphml(graphml)), path)
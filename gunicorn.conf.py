@@ -0,0 +1,46 @@
+"""
+Gunicorn configuration: gunicorn -c gunicorn.conf.py distance:app
+
+The master process loads the graph snapshot into shared memory once, before forking,
+and workers attach to it (see distance.py), so memory use for the graph doesn't grow
+with the number of workers. It also makes a directory for the workers' /metrics
+totals (see metrics.py), which is removed when it exits.
+Don't set preload_app: distance.py needs GRAPH_SHARED_MEMORY to be set when it's
+imported, which only happens once on_starting has run.
+"""
+import os
+import shutil
+import tempfile
+
+from flask import Config
+
+import graph_snapshot
+
+SHARED_MEMORY_NAME = "walkindublin-graph"
+
+shared = None
+metrics_dir = None
+
+
+def on_starting(server):
+    global shared, metrics_dir
+    config = Config(os.path.dirname(os.path.abspath(__file__)))
+    config.from_pyfile("config/common.py")
+    config.from_pyfile("config/sensitive.py", silent=True)
+    # the same overrides as distance.py, so the workers find their landmark tables, hot
+    # zones and tile index alongside the snapshot the master shares
+    if os.getenv("DEV_CONFIGURATION"):
+        config.from_envvar("DEV_CONFIGURATION")
+    shared = graph_snapshot.share(
+        graph_snapshot.load(config["GRAPH_SNAPSHOT"]), SHARED_MEMORY_NAME
+    )
+    metrics_dir = tempfile.mkdtemp(prefix="walkindublin-metrics-")
+    # workers inherit the master's environment
+    os.environ["GRAPH_SHARED_MEMORY"] = SHARED_MEMORY_NAME
+    os.environ["METRICS_DIR"] = metrics_dir
+
+
+def on_exit(server):
+    shared.close()
+    shared.unlink()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -0,0 +1,179 @@
+"""
+Precomputed isochrones for the start nodes that most /streets requests come from.
+
+An offline job runs a bounded Dijkstra from every node in the HOT_ZONES (see
+config/common.py) out to HOT_ZONE_DISTANCE, and stores every edge it reaches, with
+the distance to each of its ends in whole metres, in memory-mappable arrays
+alongside the graph snapshot. Answering a request from one of those nodes is then a
+slice of the table, with no graph traversal at all.
+
+Build the table for a snapshot with:
+
+    python hotzones.py [data/dublin.snapshot]
+"""
+
+import json
+import os
+import runpy
+import sys
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+import graph_snapshot
+
+HOT_ZONE_ARRAYS = (
+    # the source nodes, sorted
+    "hot_nodes",
+    # the edges reached from hot_nodes[i] are hot_edges[hot_indptr[i]:hot_indptr[i + 1]]
+    "hot_indptr",
+    "hot_edges",
+    # distance to each end of each edge, in whole metres; UNREACHED if it's too far
+    "hot_du",
+    "hot_dv",
+)
+
+UNREACHED = np.iinfo(np.uint16).max
+
+
+def build(graph, nodes, distance, batch_size=64):
+    """
+    Run a bounded Dijkstra from each node, and tabulate the edges it reaches.
+    Parameters
+    ----------
+    graph : GraphSnapshot
+        the street graph
+    nodes : numpy array
+        positions of the source nodes
+    distance : float
+        how far to search from each, in metres (less than UNREACHED)
+    batch_size : int
+        number of Dijkstras run at once
+    Returns
+    -------
+    arrays : dict
+        the HOT_ZONE_ARRAYS
+    meta : dict
+        the distance, and the size and build_id of the graph the table belongs to
+    """
+    nodes = np.unique(nodes)
+    counts = []
+    edges = []
+    du = []
+    dv = []
+    for start in range(0, len(nodes), batch_size):
+        distances = dijkstra(
+            graph.csgraph, indices=nodes[start : start + batch_size], limit=distance
+        )
+        quantised = np.where(
+            np.isfinite(distances), np.round(distances), UNREACHED
+        ).astype(np.uint16)
+        # an edge is reached if either of its ends is
+        reached = (quantised[:, graph.edge_u] != UNREACHED) | (
+            quantised[:, graph.edge_v] != UNREACHED
+        )
+        rows, ids = np.nonzero(reached)
+        counts.append(reached.sum(axis=1))
+        edges.append(ids.astype(np.int32))
+        du.append(quantised[rows, graph.edge_u[ids]])
+        dv.append(quantised[rows, graph.edge_v[ids]])
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    if len(nodes):
+        np.cumsum(np.concatenate(counts), out=indptr[1:])
+    arrays = {
+        "hot_nodes": nodes,
+        "hot_indptr": indptr,
+        "hot_edges": np.concatenate(edges or [np.zeros(0, dtype=np.int32)]),
+        "hot_du": np.concatenate(du or [np.zeros(0, dtype=np.uint16)]),
+        "hot_dv": np.concatenate(dv or [np.zeros(0, dtype=np.uint16)]),
+    }
+    meta = {
+        "distance": distance,
+        "n_nodes": graph.n_nodes,
+        "n_edges": graph.n_edges,
+        "build_id": graph.build_id,
+    }
+    return arrays, meta
+
+
+def save(arrays, meta, path):
+    """ Write a table to the snapshot directory at path """
+    for name in HOT_ZONE_ARRAYS:
+        np.save(os.path.join(path, name + ".npy"), arrays[name])
+    with open(os.path.join(path, "hot_meta.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def load(graph, path):
+    """
+    Memory-map the table in the snapshot directory at path. Raises IOError if there
+    isn't one, or if it was built for a different graph.
+    """
+    try:
+        with open(os.path.join(path, "hot_meta.json")) as f:
+            meta = json.load(f)
+    except IOError:
+        raise IOError(
+            "No hot zone table at %s: build one with `python hotzones.py`" % path
+        )
+    # a rebuilt graph can have the same numbers of nodes and edges, but not the same id
+    if meta.get("build_id") != graph.build_id:
+        raise IOError("Hot zone table at %s doesn't match the graph: rebuild it" % path)
+    arrays = {
+        name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+        for name in HOT_ZONE_ARRAYS
+    }
+    return HotZoneTable(arrays, meta)
+
+
+class HotZoneTable(object):
+    """
+    Read-only view of a hot zone table. See the module docstring.
+    """
+
+    def __init__(self, arrays, meta):
+        for name in HOT_ZONE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.distance = meta["distance"]
+
+    def __len__(self):
+        return len(self.hot_nodes)
+
+    def reached(self, node, distance):
+        """
+        The edges reached from a node, if the table covers it out to distance.
+        Returns
+        -------
+        edges : numpy array
+            ids of the edges with at least one end within the table's distance
+        du, dv : numpy array
+            walking distance to each end of each edge, in whole metres; UNREACHED
+            where that end is beyond the table's distance
+        Or None, if the node isn't in the table or distance is further than it goes.
+        """
+        if distance > self.distance:
+            return None
+        i = np.searchsorted(self.hot_nodes, node)
+        if i == len(self.hot_nodes) or self.hot_nodes[i] != node:
+            return None
+        rows = slice(self.hot_indptr[i], self.hot_indptr[i + 1])
+        return self.hot_edges[rows], self.hot_du[rows], self.hot_dv[rows]
+
+
+def zone_nodes(graph, zones):
+    """ Positions of the nodes in any of the zones, given as (lat, lon, radius) """
+    nodes = [graph.nodes_within(lat, lon, radius) for lat, lon, radius in zones]
+    return np.unique(np.concatenate(nodes or [np.zeros(0, dtype=np.int64)]))
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/dublin.snapshot"
+    config = runpy.run_path(os.path.join(os.path.dirname(__file__), "config/common.py"))
+    graph = graph_snapshot.load(path)
+    if config["HOT_ZONES"] is None:
+        nodes = np.arange(graph.n_nodes)
+    else:
+        nodes = zone_nodes(graph, config["HOT_ZONES"])
+    arrays, meta = build(graph, nodes, config["HOT_ZONE_DISTANCE"])
+    save(arrays, meta, path)
@@ -0,0 +1,259 @@
+"""
+Per-request timings, and running totals of them in Prometheus' text format.
+
+Each request gets a Timings, which the handlers (and generate_route) fill in with how
+long each stage of the work took, and how many route steps and Dijkstra searches it
+needed. They're sent back in the response's Server-Timing header, and added to a
+Registry, which /metrics serves.
+
+Each gunicorn worker keeps its own Registry, and a scrape of /metrics lands on any one
+of them, so the workers' totals are combined. Given a directory (gunicorn.conf.py sets
+one up as METRICS_DIR), each worker writes its totals to its own file there, at most
+once every FLUSH_INTERVAL seconds, and the worker answering a scrape adds up everyone's
+files and its own live totals. The files of workers that have exited are kept, so the
+combined counters only ever go up, as rate() and histogram_quantile() expect. Without
+a directory, the totals are just this process's.
+"""
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# histogram bucket upper bounds, in seconds (Prometheus' client defaults)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# seconds between writes of a worker's totals to the metrics directory
+FLUSH_INTERVAL = 1.0
+
+
+class Timings(object):
+    """
+    How long each stage of one request took, in seconds, and counts of the work it did,
+    in the order they were first recorded. Stages and counts recorded more than once are
+    summed. Picklable, so generate_routes' worker processes can send theirs back.
+    """
+
+    def __init__(self):
+        self.durations = OrderedDict()
+        self.counts = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        """ Time the body of a with block as stage name """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def update(self, other):
+        """ Add another Timings' durations and counts to these """
+        for name, seconds in other.durations.items():
+            self.add(name, seconds)
+        for name, n in other.counts.items():
+            self.count(name, n)
+
+    def server_timing(self, total=None):
+        """
+        A Server-Timing header value: each stage's duration in milliseconds, the total
+        if it's given, and the counts as descriptions, e.g.
+        'snap;dur=0.2, outbound;dur=31.5, total;dur=40.1, dijkstra_calls;desc="1"'
+        """
+        durations = list(self.durations.items())
+        if total is not None:
+            durations.append(("total", total))
+        metrics = ["%s;dur=%.1f" % (name, 1000 * s) for name, s in durations]
+        metrics += ['%s;desc="%d"' % (name, n) for name, n in self.counts.items()]
+        return ", ".join(metrics)
+
+
+class Histogram(object):
+    """ Cumulative bucket counts, sum and count of observed values """
+
+    def __init__(self, buckets=None, sum=0.0, count=0):
+        self.buckets = list(buckets or [0] * len(BUCKETS))
+        self.sum = sum
+        self.count = count
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.sum += other.sum
+        self.count += other.count
+
+
+class Registry(object):
+    """
+    Running totals of requests' Timings, by endpoint, optionally combined with other
+    processes' through a directory (see the module docstring). Safe to share between
+    threads.
+    """
+
+    def __init__(self, prefix="walkindublin_", directory=None):
+        self.prefix = prefix
+        self.directory = directory
+        # name -> (type, help), in the order they're rendered
+        self.families = OrderedDict(
+            [
+                (
+                    "requests_total",
+                    ("counter", "Requests handled, by endpoint and status code"),
+                ),
+                (
+                    "request_duration_seconds",
+                    ("histogram", "Time spent handling requests, by endpoint"),
+                ),
+                (
+                    "stage_duration_seconds",
+                    (
+                        "histogram",
+                        "Time spent in each stage of handling requests, by endpoint",
+                    ),
+                ),
+                (
+                    "operations_total",
+                    (
+                        "counter",
+                        "Route steps, Dijkstra searches and hot zone hits, by endpoint",
+                    ),
+                ),
+            ]
+        )
+        # (name, labels) -> value or Histogram
+        self.samples = {}
+        # name -> function returning its current value, see report
+        self.reported = OrderedDict()
+        self._flushed = 0.0
+        self._lock = threading.Lock()
+        # held while writing the totals to the directory, so only one thread does
+        self._flush_lock = threading.Lock()
+        if directory is not None:
+            atexit.register(self.flush)
+
+    def observe(self, endpoint, status, total, timings):
+        """
+        Add a request's Timings, its status code, and its total duration in seconds
+        """
+        with self._lock:
+            labels = 'endpoint="%s"' % endpoint
+            self._add("requests_total", labels + ',status="%s"' % status)
+            self._histogram("request_duration_seconds", labels).observe(total)
+            for name, seconds in timings.durations.items():
+                labels = 'endpoint="%s",stage="%s"' % (endpoint, name)
+                self._histogram("stage_duration_seconds", labels).observe(seconds)
+            for name, n in timings.counts.items():
+                labels = 'endpoint="%s",operation="%s"' % (endpoint, name)
+                self._add("operations_total", labels, n)
+        if self.directory is not None and time.time() - self._flushed > FLUSH_INTERVAL:
+            # if another thread is already writing them, leave it to that one
+            if self._flush_lock.acquire(blocking=False):
+                try:
+                    if time.time() - self._flushed > FLUSH_INTERVAL:
+                        self._write()
+                finally:
+                    self._flush_lock.release()
+
+    def report(self, name, kind, help, value):
+        """
+        Report value() as metric name, of Prometheus type kind ("counter" or "gauge"),
+        at each scrape. Values from several processes are added up
+        """
+        self.families[name] = (kind, help)
+        self.reported[name] = value
+
+    def flush(self):
+        """ Write this process's totals to its file in the directory """
+        with self._flush_lock:
+            self._write()
+
+    def render(self):
+        """ All the metrics, in Prometheus' text exposition format """
+        totals = {}
+        states = [self._state()]
+        if self.directory is not None:
+            own = os.path.join(self.directory, "%d.json" % os.getpid())
+            for path in glob.glob(os.path.join(self.directory, "*.json")):
+                if path != own:
+                    try:
+                        with open(path) as f:
+                            states.append(json.load(f))
+                    except (IOError, ValueError):
+                        # being replaced as we read it: it's counted next time
+                        pass
+        for state in states:
+            for name, labels, value in state:
+                if isinstance(value, list):
+                    histogram = Histogram(value[0], value[1], value[2])
+                    if (name, labels) in totals:
+                        totals[name, labels].merge(histogram)
+                    else:
+                        totals[name, labels] = histogram
+                else:
+                    totals[name, labels] = totals.get((name, labels), 0) + value
+        lines = []
+        for name, (kind, help) in self.families.items():
+            full_name = self.prefix + name
+            lines.append("# HELP %s %s" % (full_name, help))
+            lines.append("# TYPE %s %s" % (full_name, kind))
+            for (family, labels), value in sorted(totals.items()):
+                if family != name:
+                    continue
+                if kind != "histogram":
+                    labels = "{%s}" % labels if labels else ""
+                    lines.append("%s%s %r" % (full_name, labels, value))
+                    continue
+                bounds = [repr(b) for b in BUCKETS] + ["+Inf"]
+                for bound, n in zip(bounds, value.buckets + [value.count]):
+                    lines.append(
+                        '%s_bucket{%s,le="%s"} %d' % (full_name, labels, bound, n)
+                    )
+                lines.append("%s_sum{%s} %r" % (full_name, labels, value.sum))
+                lines.append("%s_count{%s} %d" % (full_name, labels, value.count))
+        return "\n".join(lines) + "\n"
+
+    def _add(self, name, labels, n=1):
+        self.samples[name, labels] = self.samples.get((name, labels), 0) + n
+
+    def _histogram(self, name, labels):
+        return self.samples.setdefault((name, labels), Histogram())
+
+    def _write(self):
+        """ flush(), with _flush_lock held """
+        self._flushed = time.time()
+        # written to a file of its own, then renamed into place, so a scrape never
+        # reads half of it
+        fd, temp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._state(), f)
+            os.replace(temp, os.path.join(self.directory, "%d.json" % os.getpid()))
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def _state(self):
+        """ This process's totals, as JSON-serialisable (name, labels, value) triples """
+        with self._lock:
+            state = []
+            for (name, labels), value in self.samples.items():
+                if isinstance(value, Histogram):
+                    value = [value.buckets, value.sum, value.count]
+                state.append([name, labels, value])
+        state += [[name, "", value()] for name, value in self.reported.items()]
+        return state
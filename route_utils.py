@@ -3,43 +3,39 @@ Adapted from code by Heidi M Hurst:
 https://github.com/heidimhurst/osmnx/blob/master/osmnx/route.py
 """
 
-import osmnx as ox
-import networkx as nx
-
-ox.config(use_cache=True)
 import numpy as np
 import time
-from osmnx.geo_utils import get_nearest_node, get_bearing
-from osmnx.core import graph_from_point
-import geopandas as gpd
-from shapely.geometry import Point, LineString, Polygon
+import graph_snapshot
+from graph_snapshot import bearings
+from landmarks import Router
+from metrics import Timings
 
 
-def seg_attribute(graph, start, finish, attribute="length"):
+def bearing_score(attributes, key, scale):
     """
-    Used to work around one way streets; returns value of attribute for edge.
+    Scores the difference between each edge's bearing and another bearing.
     Parameters
     ----------
-    graph : networkx graph object
-        graph containing OSM data for area of interest
-    start : int
-        id of start node
-    finish : int
-        id of finish node
-    attribute : string
-        name of attribute to be obtained (default: length)
+    attributes : dictionary
+        edge attributes, as passed to outbound_optimization
+    key : string
+        the attribute holding the bearing to compare against
+    scale : list
+        the scores for a difference of 0 and 180 degrees; scores are linearly
+        interpolated between these, and truncated to integers
     Returns
     -------
-    length : float
+    score : numpy array
+        5 if there's no bearing to compare against, or either bearing is NaN
     """
-    try:
-        attr = graph[start][finish][0][attribute]
-    except KeyError:
-        try:
-            attr = graph[finish][start][0][attribute]
-        except KeyError:
-            attr = 0
-    return attr
+    if key not in attributes:
+        return np.full(np.shape(attributes["length"]), 5.0)
+    difference = np.abs(
+        np.asarray(attributes["bearing"], dtype=np.float64)
+        - np.asarray(attributes[key], dtype=np.float64)
+    )
+    score = np.trunc(np.interp(difference, [0, 180], scale))
+    return np.where(np.isnan(difference), 5.0, score)
 
 
 def outbound_optimization(
@@ -47,13 +43,14 @@ def outbound_optimization(
 ):
     """
     This is the core function for outbound optimization.
-    Provided with a dictionary of attributes for an edge, this section scores each attribute and takes a weighted
-    average of attribute weights.  The resultant score ranges from 1 to 10 and describes how good of a fit the
-    edge in question is for the given route objectives.
+    Provided with a dictionary of attributes for a batch of candidate edges, this section scores each attribute and
+    takes a weighted average of attribute weights.  The resultant scores range from 1 to 10 and describe how good of
+    a fit each edge in question is for the given route objectives.
     Parameters
     ----------
     attributes : dictionary
-        contains attributes of each edge, including at minimum ['bearing','traveled','frequency','length']
+        contains arrays of the attributes of each edge, including at minimum
+        ['bearing','traveled','frequency','length'], and optionally previous_bearing and home_bearing
     importance : list
         list of floats containing relative importance of traveled, frequency, previous_bearing,
         home_bearing, and length (in that order).  Should, but does not have to, sum to 1.
@@ -61,50 +58,21 @@ def outbound_optimization(
         dummy variable to facilitate inbound_optimization; should be removed in future iterations
     Returns
     -------
-    suitability : float
+    suitability : numpy array
     """
 
     # setup mapping for previous bearing
-    if "previous_bearing" in attributes.keys():
-        try:
-            previous_bearing = int(
-                np.interp(
-                    abs(
-                        float(attributes["bearing"])
-                        - float(attributes["previous_bearing"])
-                    ),
-                    [0, 180],
-                    [10, 1],
-                )
-            )
-        except ValueError:
-            previous_bearing = 5
-    else:
-        previous_bearing = 5
+    previous_bearing = bearing_score(attributes, "previous_bearing", [10, 1])
 
     # mapping for bearing to home point
-    if "home_bearing" in attributes.keys():
-        try:
-            home_bearing = int(
-                np.interp(
-                    abs(
-                        float(attributes["bearing"]) - float(attributes["home_bearing"])
-                    ),
-                    [0, 180],
-                    [10, 1],
-                )
-            )
-        except ValueError:
-            home_bearing = 5
-    else:
-        home_bearing = 5
+    home_bearing = bearing_score(attributes, "home_bearing", [10, 1])
 
     # setup mapping for previous traversals
-    traveled = 1 if attributes["traveled"] else 10
-    freq = 10 if attributes["frequency"] > 0 else 1
+    traveled = np.where(attributes["traveled"], 1, 10)
+    freq = np.where(np.asarray(attributes["frequency"]) > 0, 10, 1)
 
     # length? scale...
-    length = int(np.interp(attributes["length"], [0, 50], [1, 10]))
+    length = np.trunc(np.interp(attributes["length"], [0, 50], [1, 10]))
 
     # weight all these 1-10 scales by relative importance
     suitability = (
@@ -124,6 +92,8 @@ def evaluate_edges(
     freq={},
     eval_function=lambda x: x["length"],
     pct_remaining=0,
+    edges=None,
+    rng=None,
     *args,
     **kwargs
 ):
@@ -131,136 +101,145 @@ def evaluate_edges(
     This function evaluates edges based on some evaluation function, returning the id of the best next node.
     Parameters
     ----------
-    graph : networkx graph object
-        graph containing OSM data for area of interest
+    graph : GraphSnapshot
+        graph containing OSM data for area of interest. It's shared between requests, so it's read-only
     route : list
         list of nodes traversed by a route
     freq : dict
         dictionary of frequency of traversal, where keys are in format (startnode, endnode, 0)
+    edges : RouteEdges
+        the edges traversed by route so far. If it isn't given, they're looked up from route
+    rng : numpy.random.Generator
+        source of randomness for choosing the next node; a fresh, unseeded one if it isn't given
     Returns
     -------
     next_node : int
-        id of next best node
+        position of next best node
     """
     # get all neighbors of current node
     current_node = route[-1]
 
     # get all adjacent edges
-    adj_edges = graph.out_edges(iter([current_node]), data=True)
+    adj_edges = np.arange(graph.indptr[current_node], graph.indptr[current_node + 1])
+
+    # self-loops lead nowhere: RouteEdges.extend skips them, so picking one would
+    # stall the route
+    adj_edges = adj_edges[graph.edge_v[adj_edges] != current_node]
 
     # ensure that you cannot revisit the previous nodes
     if len(route) > 1:
         previous_node = route[-2]
-        candidate_edges = [x for x in adj_edges if x[1] != previous_node]
+        candidate_edges = adj_edges[graph.edge_v[adj_edges] != previous_node]
         if len(candidate_edges) > 0:
             adj_edges = candidate_edges
 
-    # remove neighbor nodes that are dead ends (only point to one node)(?)
-    n = []
-    badnodes = []
-    goodnodes = []
-    for edge in adj_edges:
-        edge_end = edge[1]
-        nneighbor = [neighbor for neighbor in nx.all_neighbors(graph, edge_end)]
-        if len(set(nneighbor)) > 1:
-            n.append(edge)
-            goodnodes.append(edge)
-        else:
-            badnodes.append(edge)
-            # adj_edges.remove(edge) TODO FIX THIS
-    # print(badnode)
+    # remove neighbor nodes that are dead ends (only point to one node)
+    dead_ends = graph.dead_end[graph.edge_v[adj_edges]]
+    goodnodes = adj_edges[~dead_ends]
+    badnodes = adj_edges[dead_ends]
 
-    # initialize suitability list
-    suitability = []
-    n_edge = []
-
-    # for each edge, query edge attributes
-    for edge in goodnodes:
-        # set dict of attributes
-        attributes = edge[-1]
-
-        # add attributes that aren't included by default
+    # this is a terrible hack
+    # ¯\_(ツ)_/¯
+    if not len(goodnodes):
+        return int(graph.edge_v[badnodes[0]])
+
+    # query the attributes of all the candidate edges at once. These are local to this
+    # call: nothing is written back to the graph
+    n_edge = graph.edge_v[goodnodes]
+    attributes = {
+        "bearing": graph.edge_bearing[goodnodes],
+        "length": graph.edge_length[goodnodes],
         # has it been traveled before on this trip?
-        attributes["traveled"] = edge[0:-1] in zip(
-            route, route[1:], [0] * (len(route) - 2)
-        )
+        "traveled": edges.traversed[goodnodes]
+        if edges is not None
+        else np.isin(goodnodes, graph.edge_ids(route[:-1], route[1:])),
+        "frequency": np.array([freq.get((current_node, end, 0), 0) for end in n_edge]),
+    }
 
-        if (edge[0], edge[1], 0) in freq.keys():
-            attributes["frequency"] = freq[(edge[0], edge[1], 0)]
-        else:
-            attributes["frequency"] = 0
-
-        if len(route) > 1:
-            # get bearing of previous segment
-            attributes["previous_bearing"] = graph[previous_node][current_node][0][
-                "bearing"
-            ]
-            # get bearing from current node to home
-            attributes["home_bearing"] = get_bearing(
-                (graph.nodes[current_node]["y"], graph.nodes[current_node]["x"]),
-                (graph.nodes[edge[1]]["y"], graph.nodes[edge[1]]["x"]),
-            )
-
-        suitability.append(
-            eval_function(attributes=attributes, pct_remaining=pct_remaining)
+    if len(route) > 1:
+        # get bearing of previous segment
+        previous_edge = graph.edge_ids(previous_node, current_node, key=0)
+        attributes["previous_bearing"] = (
+            graph.edge_bearing[previous_edge] if previous_edge != -1 else np.nan
         )
-        n_edge.append(edge[1])
-    # this is a terrible hack
-    # ¯\_(ツ)_/¯
-    if not len(n_edge):
-        return badnodes[0][1]
+        # get bearing from current node to home
+        attributes["home_bearing"] = bearings(
+            graph.node_y[current_node],
+            graph.node_x[current_node],
+            graph.node_y[n_edge],
+            graph.node_x[n_edge],
+        )
+
+    suitability = eval_function(attributes=attributes, pct_remaining=pct_remaining)
 
     # select index randomly with probability proportional evaulation function
-    suitability = [i / sum(suitability) for i in suitability]
-    index = np.random.choice(list(range(len(suitability))), 1, suitability)[0].astype(
-        np.int64
-    )
+    suitability = suitability / suitability.sum()
+    if rng is None:
+        rng = np.random.default_rng()
+    index = rng.choice(len(suitability), p=suitability)
     # pick edge with the lowest index
-    next_node = n_edge[index]
+    next_node = int(n_edge[index])
 
     return next_node
 
 
-def next_outbound_node(graph, route, freq={}, *args, **kwargs):
+def next_outbound_node(
+    graph, route, freq={}, edges=None, rng=None, *args, **kwargs
+):
     """
     Wrapper for outbound optimization algorithm.
     Parameters
     ----------
-    graph : networkx graph object
-        graph containing OSM data for area of interest
+    graph : GraphSnapshot
+        graph containing OSM data for area of interest. It's shared between requests, so it's read-only
     route : list
         list of nodes traversed by a route
     freq : dict
         dictionary of frequency of traversal, where keys are in format (startnode, endnode, 0)
+    edges : RouteEdges
+        the edges traversed by route so far
+    rng : numpy.random.Generator
+        source of randomness for choosing the next node
     Returns
     -------
     next_node : int
-        integer ID of next best node
+        position of next best node
     """
 
     # call evaluate edges with inbound node parameters?
     next_node = evaluate_edges(
-        graph=graph, route=route, freq=freq, eval_function=outbound_optimization
+        graph=graph,
+        route=route,
+        freq=freq,
+        eval_function=outbound_optimization,
+        edges=edges,
+        rng=rng,
     )
 
     return next_node
 
 
-def next_inbound_node(graph, route, pct_remaining=0, freq={}, *args, **kwargs):
+def next_inbound_node(
+    graph, route, pct_remaining=0, freq={}, edges=None, rng=None, *args, **kwargs
+):
     """
     Wrapper for inbound optimization algorithm.
     Parameters
     ----------
-    graph : networkx graph object
-        graph containing OSM data for area of interest
+    graph : GraphSnapshot
+        graph containing OSM data for area of interest. It's shared between requests, so it's read-only
     route : list
         list of nodes traversed by a route
     freq : dict
         dictionary of frequency of traversal, where keys are in format (startnode, endnode, 0)
+    edges : RouteEdges
+        the edges traversed by route so far
+    rng : numpy.random.Generator
+        source of randomness for choosing the next node
     Returns
     -------
     next_node : int
-        integer ID of next best node
+        position of next best node
     """
     # call evaluate edges with inbound node parameters?
     next_node = evaluate_edges(
@@ -269,6 +248,8 @@ def next_inbound_node(graph, route, pct_remaining=0, freq={}, *args, **kwargs):
         freq=freq,
         eval_function=inbound_optimization,
         pct_remaining=pct_remaining,
+        edges=edges,
+        rng=rng,
     )
 
     return next_node
@@ -279,15 +260,16 @@ def inbound_optimization(
 ):
     """
     This is the core function for inbound optimization.
-    Provided with a dictionary of attributes for an edge, this section scores each attribute and takes a weighted
-    average of attribute weights.  The resultant score ranges from 1 to 10 and describes how good of a fit the
-    edge in question is for the given route objectives.  This value changes depending on what percent of the route
-    remains; as the route length reaches the goal length, more importance is placed on selecting edges that take
-    the user towards home.
+    Provided with a dictionary of attributes for a batch of candidate edges, this section scores each attribute and
+    takes a weighted average of attribute weights.  The resultant scores range from 1 to 10 and describe how good of
+    a fit each edge in question is for the given route objectives.  This value changes depending on what percent of
+    the route remains; as the route length reaches the goal length, more importance is placed on selecting edges
+    that take the user towards home.
     Parameters
     ----------
     attributes : dictionary
-        contains attributes of each edge, including at minimum ['bearing','traveled','frequency','length']
+        contains arrays of the attributes of each edge, including at minimum
+        ['bearing','traveled','frequency','length'], and optionally previous_bearing and home_bearing
     importance : list
         list of floats containing relative importance of traveled, frequency, previous_bearing,
         and length (in that order).  Should, but does not have to, sum to 1.
@@ -295,51 +277,21 @@ def inbound_optimization(
         what percent of the route goal length is remaining?
     Returns
     -------
-    suitability : float
+    suitability : numpy array
     """
 
     # setup mapping for previous bearing
-    if "previous_bearing" in attributes.keys():
-        try:
-            previous_bearing = int(
-                np.interp(
-                    abs(
-                        float(attributes["bearing"])
-                        - float(attributes["previous_bearing"])
-                    ),
-                    [0, 180],
-                    [10, 1],
-                )
-            )
-        # we've got a NaN
-        except ValueError:
-            previous_bearing = 5
-    else:
-        previous_bearing = 5
+    previous_bearing = bearing_score(attributes, "previous_bearing", [10, 1])
 
     # mapping for bearing to home point
-    if "home_bearing" in attributes.keys():
-        try:
-            home_bearing = int(
-                np.interp(
-                    abs(
-                        float(attributes["bearing"]) - float(attributes["home_bearing"])
-                    ),
-                    [0, 180],
-                    [1, 10],
-                )
-            )
-        except ValueError:
-            home_bearing = 5
-    else:
-        home_bearing = 5
+    home_bearing = bearing_score(attributes, "home_bearing", [1, 10])
 
     # setup mapping for previous traversals
-    traveled = 1 if attributes["traveled"] else 10
-    freq = 10 if attributes["frequency"] > 0 else 1
+    traveled = np.where(attributes["traveled"], 1, 10)
+    freq = np.where(np.asarray(attributes["frequency"]) > 0, 10, 1)
 
     # length? scale...
-    length = int(np.interp(attributes["length"], [0, 50], [1, 10]))
+    length = np.trunc(np.interp(attributes["length"], [0, 50], [1, 10]))
 
     # weight all these 1-10 scales by relative importance
     suitability = (
@@ -356,41 +308,64 @@ def inbound_optimization(
     return suitability
 
 
-def no_duplicates(route):
+class RouteEdges(object):
     """
-    This function removes duplicate nodes that may be present in a route, ensuring it can be plotted.
+    The edges a route has traversed, kept up to date as nodes are appended to it, so that
+    checking whether an edge has been traveled doesn't mean re-walking the route.
     Parameters
     ----------
-    route : list
-        list of nodes traversed by route, in order
-    Returns
-    -------
-    route : list
-        list of nodes traversed by route, in order, with any immediate duplicates removed
+    graph : GraphSnapshot
+        graph containing OSM data for area of interest
     """
-    if not len(route):
-        return route
-    if len(route) > 3:
-        try:
-            for i in range(len(route) - 2):
-                if route[i] == route[i + 1]:
-                    del route[i]
-        except IndexError:
-            return route
-    return route
 
-
-def novelty_score(graph, route, freq={}):
+    def __init__(self, graph):
+        self.graph = graph
+        # edge ids, in the order they were traversed
+        self.ids = []
+        # indexed by edge id
+        self.traversed = np.zeros(graph.n_edges, dtype=bool)
+
+    def extend(self, route, nodes):
+        """
+        Appends nodes to a route, recording the edges between them. Immediate duplicates
+        are skipped, so the route can always be plotted.
+        Parameters
+        ----------
+        route : list
+            list of nodes traversed by route, in order; modified in place
+        nodes : list
+            list of nodes to append
+        Returns
+        -------
+        length : float
+            length of the edges added to the route
+        """
+        length = 0
+        for node in nodes:
+            if node == route[-1]:
+                continue
+            edge = self.graph.edge_ids(route[-1], node)
+            if edge != -1:
+                self.ids.append(int(edge))
+                self.traversed[edge] = True
+                length += self.graph.edge_length[edge]
+            route.append(node)
+        return length
+
+
+def novelty_score(graph, route, freq={}, edges=None):
     """
     Returns information about how novel a route is based on a frequency dictionary.
     Parameters
     ----------
-    graph : networkx graph object
+    graph : GraphSnapshot
         graph containing OSM data for area of interest
     route : list
         list of nodes traversed by a route
     freq : dict
         dictionary of frequency of traversal, where keys are in format (startnode, endnode, 0)
+    edges : RouteEdges
+        the edges traversed by route. If it isn't given, they're looked up from route
     Returns
     -------
     novel_segments : int
@@ -398,17 +373,39 @@ def novelty_score(graph, route, freq={}):
     novel_length : float
         length (in graph length terms, usually meters) of novel road segments
     """
-    # iterate through all edges traversed
-    novel_segments = 0
-    novel_length = 0
-    for i in range(len(route) - 1):
-        if not (
-            (route[i], route[i + 1], 0) in freq.keys()
-            or (route[i + 1], route[i], 0) in freq.keys()
-        ):
-            novel_segments += 1
-            novel_length += seg_attribute(graph, route[i], route[i + 1])
-    return novel_segments, novel_length
+    if edges is not None:
+        ids = np.array(edges.ids, dtype=np.int64)
+    else:
+        ids = graph.edge_ids(route[:-1], route[1:])
+        ids = ids[ids != -1]
+    novel = np.array(
+        [
+            not ((u, v, 0) in freq or (v, u, 0) in freq)
+            for u, v in zip(graph.edge_u[ids].tolist(), graph.edge_v[ids].tolist())
+        ],
+        dtype=bool,
+    )
+    return int(novel.sum()), float(graph.edge_length[ids[novel]].sum())
+
+
+def path_home(predecessors, node):
+    """
+    Follows the predecessors from a Dijkstra over the reversed graph back to its source.
+    Parameters
+    ----------
+    predecessors : numpy array
+        predecessors from Router.distances_to, run to the home node
+    node : int
+        position of the node to start from
+    Returns
+    -------
+    path : list
+        list of nodes on the shortest path from node to home, including both
+    """
+    path = [node]
+    while predecessors[path[-1]] >= 0:
+        path.append(int(predecessors[path[-1]]))
+    return path
 
 
 def generate_route(
@@ -419,6 +416,10 @@ def generate_route(
     length_unit="km",
     freq={},
     graph=None,
+    start_node=None,
+    seed=None,
+    router=None,
+    timings=None,
     *args,
     **kwargs
 ):
@@ -443,15 +444,26 @@ def generate_route(
         unit that goal_length and tolerance are specified in - default km
     freq: dictionary
         dictionary of frequency of traversal, where keys are in format (startnode, endnode, 0)
-    graph : networkx multidigraph
+    graph : GraphSnapshot
         graph over which network will be created. needs to be network_type walk.
+    start_node : int
+        position of the start node, if it's already been snapped (see GraphSnapshot.nearest_nodes);
+        otherwise, the node nearest to lat, lon is used
+    seed : int or numpy.random.Generator
+        seed for the random choices made while building the route: the same start node, goal length
+        and seed always give the same route. Unseeded if it isn't given
+    router : Router
+        shortest-path router over graph, used to find the way home (see landmarks.Router)
+    timings : metrics.Timings
+        if given, records how long snapping (if it was done here), the outbound loop and the
+        inbound loop took, the number of steps in each loop, and the number of Dijkstra searches
     Returns
     -------
     route : list
-        list of nodes traversed by route
+        list of node positions traversed by route
     """
     # initialize timing for route finding
-    start_time = time.time()
+    start_time = time.perf_counter()
 
     # convert km to meters
     if length_unit == "km":
@@ -474,34 +486,43 @@ def generate_route(
     #         pass
 
     # get start node
-    start_node = get_nearest_node(streets, (lat, lon))
+    snapped = start_node is None
+    if snapped:
+        start_node = int(streets.nearest_nodes(lat, lon)[0])
 
     # setup
+    rng = np.random.default_rng(seed)
     route_length = 0
     route = [start_node]
+    edges = RouteEdges(streets)
 
     # outbound portion
-    out_time = time.time()
+    out_time = time.perf_counter()
+    outbound_steps = 0
     while route_length < goal_length / 2:
+        outbound_steps += 1
 
         # select node based on inbound optimization function
-        next_node = next_outbound_node(streets, route, freq, *args, **kwargs)
-
-        # augment route length
-        if type(next_node) == int:
-            route_length += seg_attribute(streets, route[-1], next_node)
-            route.append(next_node)
-        else:
-            # add new node to route
-            route.extend(next_node)
-            # todo: remove retraced edge(s)
+        next_node = next_outbound_node(
+            streets, route, freq, edges, rng, *args, **kwargs
+        )
 
-    return_time = time.time()
+        # add new node to route, and augment route length
+        route_length += edges.extend(route, [next_node])
+
+    return_time = time.perf_counter()
+    inbound_steps = 0
+    # distance home from every node that could still be on the route, from a single
+    # Dijkstra out from the start node over the reversed graph
+    if router is None:
+        router = Router(streets)
+    home_distance, home_predecessors = router.distances_to(
+        start_node, limit=goal_length + tolerance
+    )
     # inbound portion (return)
     while route[-1] != start_node and route_length < goal_length + tolerance:
-        quick_return_length = route_length + nx.shortest_path_length(
-            streets, route[-1], route[0], "length"
-        )
+        inbound_steps += 1
+        quick_return_length = route_length + home_distance[route[-1]]
 
         if quick_return_length < goal_length - 0.5 * tolerance:
             # select node based on inbound optimization function
@@ -510,29 +531,153 @@ def generate_route(
                 route=route,
                 freq=freq,
                 pct_remaining=route_length / goal_length,
+                edges=edges,
+                rng=rng,
             )
 
-            # augment route length
-            if type(next_node) == int:
-                route_length += seg_attribute(streets, route[-1], next_node)
-                route.append(next_node)
-            else:
-                # add new node to route
-                route.extend(next_node)
-                # todo: remove retraced edge(s)
+            # add new node to route, and augment route length
+            route_length += edges.extend(route, [next_node])
 
         elif quick_return_length <= goal_length + tolerance:
-            next_node = nx.shortest_path(streets, route[-1], route[0], "length")
-            route.extend(next_node)
+            next_node = path_home(home_predecessors, route[-1])
+            route_length += edges.extend(route, next_node)
             break
 
-        # prevent function for running forever
-        elif route_length > goal_length + tolerance:
+        # prevent function for running forever: we can't get home in time
+        else:
             route = [start_node]
+            edges = RouteEdges(streets)
             break
 
-    # remove duplicates
-    route = no_duplicates(route)
+    end_time = time.perf_counter()
+    if timings is not None:
+        if snapped:
+            timings.add("snap", out_time - start_time)
+        timings.add("outbound", return_time - out_time)
+        timings.add("inbound", end_time - return_time)
+        timings.count("outbound_steps", outbound_steps)
+        timings.count("inbound_steps", inbound_steps)
+        timings.count("dijkstra_calls")
+
     # get route stats
-    novel_segments, novel_length = novelty_score(streets, route, freq)
+    novel_segments, novel_length = novelty_score(streets, route, freq, edges)
     return route
+
+
+# the graph used by the worker processes of a generate_routes pool
+_pool_graph = None
+
+
+def init_pool(shared_memory=None, snapshot_path=None):
+    """
+    Initializer for the worker processes of a generate_routes pool: attaches each of them
+    to the shared graph (see graph_snapshot.share), or maps the snapshot files if it isn't
+    shared, so the workers don't copy it.
+    Parameters
+    ----------
+    shared_memory : string
+        name of the shared memory block holding the graph
+    snapshot_path : string
+        path of the snapshot directory, used if shared_memory isn't given
+    """
+    global _pool_graph
+    if shared_memory:
+        _pool_graph = graph_snapshot.attach(shared_memory)
+    else:
+        _pool_graph = graph_snapshot.load(snapshot_path)
+
+
+def _pool_route(kwargs):
+    timings = Timings()
+    return generate_route(graph=_pool_graph, timings=timings, **kwargs), timings
+
+
+def generate_routes(
+    lat,
+    lon,
+    goal_length,
+    n,
+    tolerance=0.5,
+    length_unit="km",
+    freq={},
+    graph=None,
+    start_node=None,
+    pool=None,
+    seed=None,
+    timings=None,
+):
+    """
+    This function generates several candidate loop routes for the same start point (see generate_route),
+    ranked by how close they come to the goal length, and then by novelty.
+    Parameters
+    ----------
+    lat : float
+        latitude of start point
+    lon : float
+        longitude of start point
+    goal_length : float
+        goal length of route
+    n : int
+        number of routes to generate
+    tolerance : float
+        amount of allowable error in route
+    length_unit : string
+        unit that goal_length and tolerance are specified in - default km
+    freq: dictionary
+        dictionary of frequency of traversal, where keys are in format (startnode, endnode, 0)
+    graph : GraphSnapshot
+        graph over which network will be created; used for snapping and ranking, and for generating
+        the routes if there's no pool
+    start_node : int
+        position of the start node, if it's already been snapped
+    pool : concurrent.futures.Executor
+        if given, the routes are generated in parallel on this pool, whose workers must have been
+        initialised with init_pool
+    seed : int
+        seed for the whole batch; each route gets its own seed derived from it
+    timings : metrics.Timings
+        if given, records generate_route's timings and counts, summed over the routes
+    Returns
+    -------
+    routes : list
+        list of routes, each a list of node positions, best first
+    """
+    if start_node is None:
+        snap_time = time.perf_counter()
+        start_node = int(graph.nearest_nodes(lat, lon)[0])
+        if timings is not None:
+            timings.add("snap", time.perf_counter() - snap_time)
+    kwargs = dict(
+        lat=lat,
+        lon=lon,
+        goal_length=goal_length,
+        tolerance=tolerance,
+        length_unit=length_unit,
+        freq=freq,
+        start_node=start_node,
+    )
+    batch = [
+        dict(kwargs, seed=int(route_seed))
+        for route_seed in np.random.SeedSequence(seed).generate_state(n)
+    ]
+    if pool is not None:
+        routes = []
+        for route, route_timings in pool.map(_pool_route, batch):
+            routes.append(route)
+            if timings is not None:
+                timings.update(route_timings)
+    else:
+        routes = [
+            generate_route(graph=graph, timings=timings, **route_kwargs)
+            for route_kwargs in batch
+        ]
+
+    goal = 1000 * goal_length if length_unit == "km" else goal_length
+
+    def rank(route):
+        ids = graph.edge_ids(route[:-1], route[1:])
+        length = graph.edge_length[ids[ids != -1]].sum()
+        novel_segments, novel_length = novelty_score(graph, route, freq)
+        return abs(length - goal), -novel_length
+
+    return sorted(routes, key=rank)
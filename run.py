@@ -1,3 +1,5 @@
 from distance import app
 
-app.run(host="0.0.0.0")
+# the /routes pool's spawned workers re-run this module, so they mustn't start a server
+if __name__ == "__main__":
+    app.run(host="0.0.0.0")
@@ -0,0 +1,223 @@
+"""
+GeoJSON responses, written straight from the graph snapshot's packed edge coordinates.
+
+Going through a GeoDataFrame's __geo_interface__ and json.dumps builds a Shapely
+object, then a tuple, then a string, for every vertex. Here each feature's
+coordinates stay a slice of one numpy array, which orjson serialises natively. If
+orjson isn't installed, the stdlib json module is used instead, which is slower but
+still skips Shapely.
+"""
+
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def edge_features(
+    graph, edges, properties=None, precision=None, tolerance=None, cuts=None
+):
+    """
+    A GeoJSON FeatureCollection of edges, and their bounds.
+    Parameters
+    ----------
+    graph : GraphSnapshot
+        the street graph
+    edges : numpy array
+        ids of the edges to include. Each feature's id is its edge id
+    properties : dict
+        optional feature properties: name -> array with a value for each edge
+    precision : int
+        round coordinates to this many decimal places (6 is about 0.1 m)
+    tolerance : float
+        simplify the geometries to this tolerance, in metres (see
+        GraphSnapshot.edge_coords)
+    cuts : tuple
+        optional (start, end) arrays: cut each edge down to that stretch of it (see
+        GraphSnapshot.edge_coords and walk_limits.isochrone_cut)
+    Returns
+    -------
+    feature_collection : dict
+        the FeatureCollection. Its coordinates are numpy arrays: serialise it with dumps
+    bounds : list
+        [min lon, min lat, max lon, max lat], or all None if there are no edges
+    """
+    offsets, coords = graph.edge_coords(edges, tolerance, *(cuts or ()))
+    if precision is not None:
+        coords = np.round(coords, precision)
+    if len(coords):
+        bounds = np.concatenate([coords.min(axis=0), coords.max(axis=0)]).tolist()
+    else:
+        bounds = [None] * 4
+    columns = {
+        name: np.asarray(values).tolist() for name, values in (properties or {}).items()
+    }
+    features = [
+        {
+            "id": str(edge),
+            "type": "Feature",
+            "properties": {name: values[i] for name, values in columns.items()},
+            "geometry": {"type": "LineString", "coordinates": coords[start:end]},
+        }
+        for i, (edge, start, end) in enumerate(
+            zip(np.asarray(edges).tolist(), offsets[:-1].tolist(), offsets[1:].tolist())
+        )
+    ]
+    return {"type": "FeatureCollection", "features": features}, bounds
+
+
+def feature_lines(graph, edges, properties=None, chunk_size=1000, cuts=None, **kwargs):
+    """
+    Newline-delimited GeoJSON Features for edges, in order, generated chunk_size edges
+    at a time, so only one chunk's geometries (cut, if cuts are given) are ever held in
+    memory. The other arguments are passed to edge_features.
+    """
+    for start in range(0, len(edges), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        if cuts is not None:
+            kwargs["cuts"] = [fractions[chunk] for fractions in cuts]
+        collection, _ = edge_features(
+            graph,
+            edges[chunk],
+            {name: values[chunk] for name, values in (properties or {}).items()},
+            **kwargs
+        )
+        yield b"".join(dumps(feature) + b"\n" for feature in collection["features"])
+
+
+def polygon_features(polygons, properties=None, precision=None):
+    """
+    A GeoJSON FeatureCollection of shapely polygons, and their bounds.
+    Parameters
+    ----------
+    polygons : list
+        WGS84 shapely geometries
+    properties : dict
+        optional feature properties: name -> array with a value for each polygon
+    precision : int
+        round coordinates to this many decimal places
+    Returns
+    -------
+    feature_collection : dict
+    bounds : list
+        [min lon, min lat, max lon, max lat], or all None if the polygons are empty
+    """
+    from shapely.geometry import mapping
+    from shapely.ops import transform
+
+    if precision is not None:
+        polygons = [
+            transform(lambda x, y: (np.round(x, precision), np.round(y, precision)), p)
+            for p in polygons
+        ]
+    columns = {
+        name: np.asarray(values).tolist() for name, values in (properties or {}).items()
+    }
+    features = [
+        {
+            "type": "Feature",
+            "properties": {name: values[i] for name, values in columns.items()},
+            "geometry": mapping(polygon),
+        }
+        for i, polygon in enumerate(polygons)
+    ]
+    extents = np.array([p.bounds for p in polygons if not p.is_empty]).reshape(-1, 4)
+    if len(extents):
+        bounds = np.concatenate(
+            [extents[:, :2].min(axis=0), extents[:, 2:].max(axis=0)]
+        ).tolist()
+    else:
+        bounds = [None] * 4
+    return {"type": "FeatureCollection", "features": features}, bounds
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError("%r is not JSON serializable" % obj)
+
+
+def dumps(obj):
+    """ Serialise a response containing numpy arrays to JSON bytes """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_default).encode("utf-8")
+
+
+def encode_polylines(offsets, coords, precision=5):
+    """
+    Encode packed lines with Google's polyline algorithm, all at once.
+    Parameters
+    ----------
+    offsets : numpy array
+        the vertices of line i are coords[offsets[i]:offsets[i + 1]]
+    coords : numpy array
+        (lon, lat) vertices
+    precision : int
+        number of decimal places kept (5 is about 1 m)
+    Returns
+    -------
+    polylines : list
+        an encoded string for each line
+    """
+    # quantised (lat, lon) pairs, delta-encoded along each line, whose first vertex
+    # is encoded relative to (0, 0)
+    points = np.round(coords[:, ::-1] * 10 ** precision).astype(np.int64)
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    starts = offsets[:-1][offsets[:-1] < offsets[1:]]
+    deltas[starts] = points[starts]
+    # zigzag, so small negative numbers stay small, then split into 5-bit chunks,
+    # least significant first. Every value has at least one chunk, and all but its
+    # last chunk are flagged with 0x20
+    values = deltas.ravel()
+    values = (values << 1) ^ (values >> 63)
+    shifts = 5 * np.arange(13, dtype=np.int64)
+    remaining = values[:, None] >> shifts
+    present = remaining > 0
+    present[:, 0] = True
+    chunks = remaining & 0x1F
+    chunks[:, :-1] |= present[:, 1:] * 0x20
+    text = (chunks[present] + 63).astype(np.uint8).tobytes().decode("ascii")
+    # each line's characters are the chunks of its vertices' values
+    chars = np.zeros(len(coords) + 1, dtype=np.intp)
+    np.cumsum(present.sum(axis=1).reshape(-1, 2).sum(axis=1), out=chars[1:])
+    ends = chars[offsets].tolist()
+    return [text[start:end] for start, end in zip(ends[:-1], ends[1:])]
+
+
+def edge_polylines(
+    graph, edges, properties=None, precision=5, tolerance=None, cuts=None
+):
+    """
+    Compact alternative to edge_features: the edges' geometries as encoded polylines
+    (see encode_polylines), and their bounds. The arguments are as for edge_features.
+    Returns
+    -------
+    polylines : dict
+        {"type": "Polylines", "precision": precision, "ids": [edge ids],
+        "polylines": [encoded geometries], "properties": {name: [values]}}
+    bounds : list
+        [min lon, min lat, max lon, max lat], or all None if there are no edges
+    """
+    offsets, coords = graph.edge_coords(edges, tolerance, *(cuts or ()))
+    if len(coords):
+        bounds = np.concatenate([coords.min(axis=0), coords.max(axis=0)]).tolist()
+    else:
+        bounds = [None] * 4
+    return (
+        {
+            "type": "Polylines",
+            "precision": precision,
+            "ids": np.asarray(edges).tolist(),
+            "polylines": encode_polylines(offsets, coords, precision),
+            "properties": {
+                name: np.asarray(values).tolist()
+                for name, values in (properties or {}).items()
+            },
+        },
+        bounds,
+    )
@@ -138,6 +138,73 @@ $("#buildwalk").click(function() {
     // glWalkSuccess(pc);
 })
 
+// Ask for edges as encoded polylines, which are several times smaller than GeoJSON
+const POLYLINE_MIMETYPE = 'application/vnd.walkindublin.polyline+json';
+
+function postForEdges(url, crd) {
+    // geometries are simplified to suit the zoom level we'll fly to
+    crd["zoom"] = 16;
+    return $.ajax({
+        url: url,
+        type: 'POST',
+        data: JSON.stringify(crd),
+        dataType: 'json',
+        headers: {
+            'Accept': POLYLINE_MIMETYPE
+        }
+    });
+}
+
+// Decode a Google encoded polyline into [lon, lat] pairs
+function decodePolyline(str, precision) {
+    const factor = Math.pow(10, precision);
+    var coordinates = [];
+    var lat = 0;
+    var lon = 0;
+    var i = 0;
+    while (i < str.length) {
+        var deltas = [0, 0];
+        for (var j = 0; j < 2; j++) {
+            var result = 0;
+            var shift = 0;
+            var b;
+            do {
+                b = str.charCodeAt(i++) - 63;
+                result |= (b & 0x1f) << shift;
+                shift += 5;
+            } while (b >= 0x20);
+            deltas[j] = (result & 1) ? ~(result >> 1) : (result >> 1);
+        }
+        lat += deltas[0];
+        lon += deltas[1];
+        coordinates.push([lon / factor, lat / factor]);
+    }
+    return coordinates;
+}
+
+// GeoJSON features from either response format
+function toFeatures(edges) {
+    if (edges['type'] !== 'Polylines') {
+        return edges['features'];
+    }
+    const names = Object.keys(edges['properties']);
+    return edges['polylines'].map(function(polyline, i) {
+        var properties = {};
+        names.forEach(function(name) {
+            properties[name] = edges['properties'][name][i];
+        });
+        return {
+            'id': String(edges['ids'][i]),
+            'type': 'Feature',
+            'properties': properties,
+            'geometry': {
+                'type': 'LineString',
+                'coordinates': decodePolyline(polyline, edges['precision'])
+            }
+        };
+    });
+}
+
 // If we can't geolocate for some reason
 function glError() {
     $("#feedback").addClass("is-invalid");
@@ -150,7 +217,7 @@ function glStreetsSuccess(pc) {
         "lat": pc.coords.latitude
     };
     $("#allstreets").attr('value', 'Wait…').text('Wait…');
-    $.post("/streets", JSON.stringify(crd))
+    postForEdges("/streets", crd)
         .done(function(data) {
             addToMap(pc, data);
             $("#allstreets").attr('value', 'Show All Streets').text("Show All Streets");
@@ -166,7 +233,7 @@ function glWalkSuccess(pc) {
         "lat": pc.coords.latitude
     };
     $("#buildwalk").attr('value', 'Wait…').text('Wait…');
-    $.post("/route", JSON.stringify(crd))
+    postForEdges("/route", crd)
         .done(function(data) {
             addToMap(pc, data);
             $("#buildwalk").attr('value', 'Show All Streets').text("Show All Streets");
@@ -199,7 +266,7 @@ function addToMap(pc, data) {
     }
     // check if Source exists, add if not
     // first, build a Turf featureCollection, so we can buffer it
-    var fc = featureCollection(data[0]['features']);
+    var fc = featureCollection(toFeatures(data[0]));
     if (!map.getSource("routes")) {
         map.addSource("routes", {
                 "type": "geojson",
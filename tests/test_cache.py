@@ -0,0 +1,30 @@
+from cache import FakeRedis, RedisCache, make_cache
+
+
+class Unavailable(Exception):
+    pass
+
+
+class DownRedis(object):
+    def get(self, key):
+        raise Unavailable()
+
+    def set(self, key, value, ex=None):
+        raise Unavailable()
+
+
+def test_redis_errors_are_misses():
+    cache = RedisCache(DownRedis(), 100, errors=(Unavailable,))
+    cache.set("key", b"value")
+    assert cache.get("key") is None
+    assert cache.misses == 1
+
+
+def test_namespaces_keep_entries_apart():
+    config = {"CACHE_BACKEND": "fake", "CACHE_MAX_BYTES": 100, "CACHE_TTL": None}
+    old = make_cache(config, namespace="v1:a")
+    new = make_cache(config, namespace="v1:b")
+    new.client = old.client = FakeRedis()
+    old.set("streets:1", b"old")
+    assert new.get("streets:1") is None
+    assert old.get("streets:1") == b"old"
@@ -0,0 +1,28 @@
+import os
+import threading
+
+from metrics import Registry, Timings
+
+
+def test_threads_can_flush_at_once(tmp_path):
+    registry = Registry(directory=str(tmp_path))
+    errors = []
+
+    def work():
+        for _ in range(100):
+            try:
+                registry.flush()
+                registry.observe("streets", 200, 0.01, Timings())
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(str(tmp_path)) == ["%d.json" % os.getpid()]
+    assert 'walkindublin_requests_total{endpoint="streets",status="200"} 800' in (
+        registry.render()
+    )
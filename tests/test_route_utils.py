@@ -0,0 +1,53 @@
+import networkx as nx
+import numpy as np
+
+import graph_snapshot
+from route_utils import generate_route, next_outbound_node
+
+
+def lollipop():
+    """
+    A 3 x 3 grid of streets about 100 m apart, with a cul-de-sac off one corner whose
+    end node has a self-loop
+    """
+    G = nx.MultiDiGraph(name="lollipop", crs="epsg:4326")
+    for i in range(3):
+        for j in range(3):
+            G.add_node(10 * i + j, x=-6.26 + 0.0015 * j, y=53.34 + 0.0009 * i)
+    G.add_node(100, x=-6.2615, y=53.3391)
+    G.add_node(101, x=-6.263, y=53.3382)
+
+    def street(a, b, length=100.0):
+        G.add_edge(a, b, length=length)
+        if a != b:
+            G.add_edge(b, a, length=length)
+
+    for i in range(3):
+        for j in range(3):
+            if j < 2:
+                street(10 * i + j, 10 * i + j + 1)
+            if i < 2:
+                street(10 * i + j, 10 * (i + 1) + j)
+    street(0, 100)
+    street(100, 101)
+    street(101, 101, length=50.0)
+    return graph_snapshot.build(G)
+
+
+def test_self_loops_are_not_candidates():
+    graph = lollipop()
+    stem, end = graph.node_index([100, 101]).tolist()
+    # the self-loop is the only way on that doesn't turn back, but it goes nowhere
+    next_node = next_outbound_node(graph, [stem, end], rng=np.random.default_rng(0))
+    assert next_node == stem
+
+
+def test_routes_leave_a_lollipop():
+    graph = lollipop()
+    start = int(graph.node_index([100])[0])
+    for seed in range(20):
+        route = generate_route(
+            None, None, 1.2, graph=graph, start_node=start, seed=seed
+        )
+        assert route[0] == start
+        assert all(a != b for a, b in zip(route[:-1], route[1:]))
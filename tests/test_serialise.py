@@ -0,0 +1,47 @@
+import numpy as np
+
+from serialise import encode_polylines
+
+
+def reference_polyline(points, precision=5):
+    """ Google's polyline algorithm, one (lat, lon) value at a time """
+    out = []
+    previous = (0, 0)
+    for lat, lon in points:
+        point = (int(round(lat * 10 ** precision)), int(round(lon * 10 ** precision)))
+        for value, last in zip(point, previous):
+            value -= last
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        previous = point
+    return "".join(out)
+
+
+def test_google_example():
+    # https://developers.google.com/maps/documentation/utilities/polylinealgorithm
+    coords = np.array([[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]])
+    assert encode_polylines(np.array([0, 3]), coords) == ["_p~iF~ps|U_ulLnnqC_mqNvxq`@"]
+
+
+def test_matches_reference():
+    lines = [
+        # small steps either way, across the prime meridian
+        [(-6.26, 53.34), (-6.25999, 53.33999), (0.00001, 53.34), (-0.00001, 53.34)],
+        # an empty line
+        [],
+        # large deltas, up to the full range of longitude and latitude
+        [(-179.99999, -89.99999), (179.99999, 89.99999), (-179.99999, 0.0)],
+        [(0.0, 0.0)],
+    ]
+    offsets = np.cumsum([0] + [len(line) for line in lines])
+    coords = np.array([point for line in lines for point in line])
+    for precision in (5, 6):
+        expected = [
+            reference_polyline([(lat, lon) for lon, lat in line], precision)
+            for line in lines
+        ]
+        assert encode_polylines(offsets, coords, precision) == expected
+    assert encode_polylines(np.array([0]), np.zeros((0, 2))) == []
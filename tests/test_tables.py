@@ -0,0 +1,46 @@
+import networkx as nx
+import pytest
+
+import graph_snapshot
+import hotzones
+import landmarks
+import tiles
+
+
+def square(length):
+    """ Four nodes joined in a ring by two-way streets of the given length """
+    G = nx.MultiDiGraph(name="square", crs="epsg:4326")
+    corners = [(-6.26, 53.34), (-6.2585, 53.34), (-6.2585, 53.3409), (-6.26, 53.3409)]
+    for node, (x, y) in enumerate(corners):
+        G.add_node(node, x=x, y=y)
+    for a in range(4):
+        b = (a + 1) % 4
+        G.add_edge(a, b, length=length)
+        G.add_edge(b, a, length=length)
+    return graph_snapshot.build(G)
+
+
+def test_hot_zones_belong_to_one_build(tmp_path):
+    graph = square(100.0)
+    hotzones.save(*hotzones.build(graph, [0], 500), str(tmp_path))
+    assert len(hotzones.load(graph, str(tmp_path))) == 1
+    # the same numbers of nodes and edges, but different distances
+    with pytest.raises(IOError):
+        hotzones.load(square(120.0), str(tmp_path))
+
+
+def test_landmarks_belong_to_one_build(tmp_path):
+    graph = square(100.0)
+    landmarks.save(*landmarks.build(graph, 2), str(tmp_path))
+    assert landmarks.load(graph, str(tmp_path)).path(0, 2)[0] == 200.0
+    with pytest.raises(IOError):
+        landmarks.load(square(120.0), str(tmp_path))
+
+
+def test_tile_index_belongs_to_one_build(tmp_path):
+    graph = square(100.0)
+    tiles.save(*tiles.build(graph), str(tmp_path))
+    index = tiles.load(graph, str(tmp_path))
+    assert index.tile_edges(0, 0, 0).tolist() == list(range(graph.n_edges))
+    with pytest.raises(IOError):
+        tiles.load(square(120.0), str(tmp_path))
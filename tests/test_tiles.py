@@ -0,0 +1,61 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+import graph_snapshot
+import tiles
+
+mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+
+
+def street_graph():
+    """ Three two-way streets in a row, about 70 m long """
+    G = nx.MultiDiGraph(name="streets", crs="epsg:4326")
+    corners = [(-6.26, 53.34), (-6.259, 53.3405), (-6.258, 53.34), (-6.257, 53.3405)]
+    for node, (x, y) in enumerate(corners):
+        G.add_node(node, x=x, y=y)
+    for a in range(3):
+        G.add_edge(a, a + 1, length=70.0)
+        G.add_edge(a + 1, a, length=70.0)
+    return graph_snapshot.build(G)
+
+
+def test_varints():
+    values = [0, 1, 127, 128, 300, 2 ** 35, 2 ** 63 - 1]
+    encoded, sizes = tiles._varints(values)
+    assert encoded == b"".join(tiles._varint(v) for v in values)
+    assert sizes.tolist() == [len(tiles._varint(v)) for v in values]
+
+
+def test_tile_decodes():
+    graph = street_graph()
+    z = 16
+    mx, my = tiles.mercator(graph.node_x, graph.node_y)
+    x, y = int(mx[1] * 2 ** z), int(my[1] * 2 ** z)
+    # the last node is out of reach
+    distances = np.array([0, 70.4, 140.6, np.inf])
+    tile = tiles.encode_tile(
+        graph, tiles.TileIndex(graph), z, x, y, distances=distances
+    )
+    layer = mapbox_vector_tile.decode(tile, default_options={"y_coord_down": True})[
+        tiles.LAYER_NAME
+    ]
+    assert layer["extent"] == tiles.EXTENT
+    features = {feature["id"]: feature for feature in layer["features"]}
+    assert sorted(features) == list(range(graph.n_edges))
+    points = np.column_stack(
+        [
+            np.round(mx * 2 ** z * tiles.EXTENT - x * tiles.EXTENT),
+            np.round(my * 2 ** z * tiles.EXTENT - y * tiles.EXTENT),
+        ]
+    ).astype(int)
+    for edge, feature in features.items():
+        u, v = graph.edge_u[edge], graph.edge_v[edge]
+        assert feature["geometry"]["type"] == "LineString"
+        assert feature["geometry"]["coordinates"] == [
+            points[u].tolist(),
+            points[v].tolist(),
+        ]
+        # the walking distance to the farther end, in whole metres
+        expected = {1: 70, 2: 141, 3: None}[max(u, v)]
+        assert feature["properties"].get("distance") == expected
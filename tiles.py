@@ -0,0 +1,297 @@
+"""
+Mapbox Vector Tiles of the street graph.
+
+TileIndex maps each zoom INDEX_ZOOM tile to the edges that cross it. The tiles are
+numbered by their Morton (Z-order) codes, so any tile at a lower zoom covers one
+contiguous range of codes, and finding its edges is two binary searches. It's built
+with the snapshot, and memory-mapped from it, so the workers share one copy:
+
+    python tiles.py [data/dublin.snapshot]
+
+encode_tile writes a single-layer ("streets") tile, following version 2.1 of the
+spec (https://github.com/mapbox/vector-tile-spec). Its protobuf is written by
+hand, so there's no protobuf dependency. Each feature's id is its edge id. If
+reachability distances are given, each reachable edge gets a "distance" property:
+the walking distance to its farther end, in whole metres.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+import graph_snapshot
+
+INDEX_ZOOM = 14
+EXTENT = 4096
+LAYER_NAME = "streets"
+
+TILE_ARRAYS = (
+    # Morton codes of the INDEX_ZOOM tiles crossed by each edge's bounding box, sorted,
+    # and the edge each is for
+    "tile_codes",
+    "tile_edges",
+    # edge bounding boxes, in world Mercator coordinates
+    "tile_bounds",
+)
+
+
+def mercator(lons, lats):
+    """ Web Mercator coordinates of points, scaled to [0, 1) across the world """
+    x = (np.asarray(lons) + 180.0) / 360.0
+    lats = np.radians(lats)
+    y = (1.0 - np.log(np.tan(lats) + 1.0 / np.cos(lats)) / np.pi) / 2.0
+    return x, y
+
+
+def morton(x, y):
+    """ Interleave the bits of tile coordinates x and y (up to 16 bits each) """
+    codes = []
+    for c in (np.asarray(x, dtype=np.uint64), np.asarray(y, dtype=np.uint64)):
+        c = (c | (c << np.uint64(8))) & np.uint64(0x00FF00FF)
+        c = (c | (c << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+        c = (c | (c << np.uint64(2))) & np.uint64(0x33333333)
+        c = (c | (c << np.uint64(1))) & np.uint64(0x55555555)
+        codes.append(c)
+    return codes[0] | (codes[1] << np.uint64(1))
+
+
+def tile_bounds(z, x, y):
+    """ (min lon, min lat, max lon, max lat) of a tile """
+    n = 2.0 ** z
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.array([y + 1, y]) / n))))
+    return x / n * 360.0 - 180.0, lats[0], (x + 1) / n * 360.0 - 180.0, lats[1]
+
+
+def build(graph):
+    """
+    The tile index of a graph: the TILE_ARRAYS, and a dict of the build_id of the graph
+    they belong to
+    """
+    scale = 2 ** INDEX_ZOOM
+    mx, my = mercator(graph.geom_coords[:, 0], graph.geom_coords[:, 1])
+    tx = np.clip((mx * scale).astype(np.int64), 0, scale - 1)
+    ty = np.clip((my * scale).astype(np.int64), 0, scale - 1)
+    starts = graph.geom_offsets[:-1]
+    bounds = np.column_stack(
+        [
+            np.minimum.reduceat(mx, starts),
+            np.minimum.reduceat(my, starts),
+            np.maximum.reduceat(mx, starts),
+            np.maximum.reduceat(my, starts),
+        ]
+    )
+    x0 = np.minimum.reduceat(tx, starts)
+    x1 = np.maximum.reduceat(tx, starts)
+    y0 = np.minimum.reduceat(ty, starts)
+    y1 = np.maximum.reduceat(ty, starts)
+    # every tile in each edge's bounding box
+    width = x1 - x0 + 1
+    cells = width * (y1 - y0 + 1)
+    edges = np.repeat(np.arange(graph.n_edges), cells)
+    first = np.repeat(np.cumsum(cells) - cells, cells)
+    dy, dx = np.divmod(np.arange(len(edges)) - first, width[edges])
+    codes = morton(x0[edges] + dx, y0[edges] + dy)
+    order = np.argsort(codes, kind="stable")
+    arrays = {
+        "tile_codes": codes[order],
+        "tile_edges": edges[order],
+        "tile_bounds": bounds,
+    }
+    return arrays, {"build_id": graph.build_id}
+
+
+def save(arrays, meta, path):
+    """ Write a tile index to the snapshot directory at path """
+    for name in TILE_ARRAYS:
+        np.save(os.path.join(path, name + ".npy"), arrays[name])
+    with open(os.path.join(path, "tile_meta.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def load(graph, path):
+    """
+    A TileIndex for graph, from the tile index in the snapshot directory at path
+    (memory-mapped). Raises IOError if there isn't one, or if it was built for a
+    different graph.
+    """
+    try:
+        with open(os.path.join(path, "tile_meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+            for name in TILE_ARRAYS
+        }
+    except IOError:
+        raise IOError("No tile index at %s: build it with `python tiles.py`" % path)
+    # a rebuilt graph can have as many edges as the old one, in different places
+    if meta.get("build_id") != graph.build_id:
+        raise IOError("Tile index at %s doesn't match the graph: rebuild it" % path)
+    return TileIndex(graph, arrays)
+
+
+class TileIndex(object):
+    """
+    Which edges cross each zoom INDEX_ZOOM tile, judging by their bounding boxes.
+    Tiles at higher zooms are answered from their INDEX_ZOOM parent, then filtered by
+    the edges' bounding boxes. Without a saved index (see load), it's built here.
+    """
+
+    def __init__(self, graph, arrays=None):
+        self.graph = graph
+        if arrays is None:
+            arrays, _ = build(graph)
+        self.codes = arrays["tile_codes"]
+        self.edges = arrays["tile_edges"]
+        self.bounds = arrays["tile_bounds"]
+
+    def tile_edges(self, z, x, y):
+        """ Ids of the edges that cross tile (z, x, y), in ascending order """
+        if z >= INDEX_ZOOM:
+            shift = z - INDEX_ZOOM
+            first = morton(x >> shift, y >> shift)
+            last = first + np.uint64(1)
+        else:
+            shift = INDEX_ZOOM - z
+            first = morton(x << shift, y << shift)
+            last = first + np.uint64(4 ** shift)
+        lo, hi = np.searchsorted(self.codes, [first, last])
+        edges = np.unique(self.edges[lo:hi])
+        if z > INDEX_ZOOM:
+            bounds = self.bounds[edges] * 2 ** z
+            edges = edges[
+                (bounds[:, 0] <= x + 1)
+                & (bounds[:, 2] >= x)
+                & (bounds[:, 1] <= y + 1)
+                & (bounds[:, 3] >= y)
+            ]
+        return edges
+
+
+def _varint(n):
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _message(field, payload):
+    """ A length-delimited protobuf field """
+    return _varint(field << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _varints(values):
+    """
+    Protobuf varint encoding of an array of non-negative ints, all at once.
+    Returns the bytes, and the number of bytes of each value.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    groups = values[:, None] >> (np.uint64(7) * np.arange(10, dtype=np.uint64))
+    present = groups > 0
+    present[:, 0] = True
+    groups = groups & np.uint64(0x7F)
+    groups[:, :-1] |= present[:, 1:] * np.uint64(0x80)
+    return groups[present].astype(np.uint8).tobytes(), present.sum(axis=1)
+
+
+def encode_tile(graph, index, z, x, y, distances=None, tolerance=None):
+    """
+    Encode the streets in a tile as a Mapbox Vector Tile.
+    Parameters
+    ----------
+    graph : GraphSnapshot
+        the street graph
+    index : TileIndex
+        tile index of graph
+    z, x, y : int
+        the tile
+    distances : numpy array
+        optional walking distance to every node, inf where it's unreachable (as
+        returned by walk_limits.reachable_edges)
+    tolerance : float
+        simplify geometries to this tolerance, in metres
+    Returns
+    -------
+    tile : bytes
+    """
+    edges = index.tile_edges(z, x, y)
+    if not len(edges):
+        return b""
+    offsets, coords = graph.edge_coords(edges, tolerance)
+    # integer tile coordinates, dropping vertices that land on the one before
+    mx, my = mercator(coords[:, 0], coords[:, 1])
+    scale = 2.0 ** z * EXTENT
+    points = np.column_stack(
+        [np.round(mx * scale - x * EXTENT), np.round(my * scale - y * EXTENT)]
+    ).astype(np.int64)
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = (points[1:] != points[:-1]).any(axis=1)
+    keep[offsets[:-1]] = True
+    points = points[keep]
+    counts = np.add.reduceat(keep, offsets[:-1])
+    # lines that collapsed to a point aren't drawable
+    drawn = counts >= 2
+    points = points[np.repeat(drawn, counts)]
+    edges = edges[drawn]
+    counts = counts[drawn]
+    if not len(edges):
+        return b""
+    starts = np.cumsum(counts) - counts
+    # each line is MoveTo(1) followed by LineTo(n - 1), with zigzagged deltas from the
+    # previous vertex (the cursor starts at (0, 0) for each feature)
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    deltas[starts] = points[starts]
+    deltas = (deltas << 1) ^ (deltas >> 63)
+    lengths = 2 * counts + 2
+    line_starts = np.cumsum(lengths) - lengths
+    stream = np.empty(lengths.sum(), dtype=np.int64)
+    stream[line_starts] = 1 | (1 << 3)
+    stream[line_starts + 3] = 2 | ((counts - 1) << 3)
+    local = np.arange(len(points)) - np.repeat(starts, counts)
+    positions = np.repeat(line_starts, counts) + 1 + 2 * local + (local > 0)
+    stream[positions] = deltas[:, 0]
+    stream[positions + 1] = deltas[:, 1]
+    text, sizes = _varints(stream)
+    ends = np.concatenate([[0], np.cumsum(sizes)])[
+        np.concatenate([line_starts, [len(stream)]])
+    ].tolist()
+
+    tags = [b""] * len(edges)
+    keys = []
+    values = []
+    if distances is not None:
+        farthest = np.maximum(
+            distances[graph.edge_u[edges]], distances[graph.edge_v[edges]]
+        )
+        reached = np.isfinite(farthest)
+        metres, value_index = np.unique(
+            np.round(farthest[reached]).astype(np.int64), return_inverse=True
+        )
+        keys = [b"distance"]
+        values = [_varint(5 << 3) + _varint(m) for m in metres.tolist()]
+        for i, v in zip(np.flatnonzero(reached).tolist(), value_index.tolist()):
+            tags[i] = _message(2, b"\x00" + _varint(v))
+
+    features = [
+        _message(
+            2,
+            b"\x08" + _varint(edge) + tags[i] + b"\x18\x02" + _message(4, text[a:b]),
+        )
+        for i, (edge, a, b) in enumerate(zip(edges.tolist(), ends[:-1], ends[1:]))
+    ]
+    layer = b"".join(
+        [b"\x78\x02", _message(1, LAYER_NAME.encode("utf-8"))]
+        + features
+        + [_message(3, key) for key in keys]
+        + [_message(4, value) for value in values]
+        + [b"\x28" + _varint(EXTENT)]
+    )
+    return _message(3, layer)
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/dublin.snapshot"
+    save(*build(graph_snapshot.load(path)), path)
@@ -1,12 +1,260 @@
-import osmnx as ox
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import Delaunay, QhullError
+from shapely.geometry import LineString, MultiPoint
+from shapely.ops import polygonize, transform, unary_union
 
-def truncate(graph, centre, distance=2000):
-    centre_node = ox.get_nearest_node(graph, centre)
-    truncated = ox.core.truncate_graph_dist(
-        graph, centre_node, max_distance=distance, weight="length", retain_all=False
-    )
-    gdf_truncated = ox.save_load.graph_to_gdfs(
-        truncated, nodes=False, edges=True, node_geometry=False, fill_edge_geometry=True
+
+def reachable_edges(graph, centre_node, distance):
+    """
+    Find the edges within walking distance of a node, with a single bounded Dijkstra
+    over the graph snapshot's arrays. As with osmnx's truncate_graph_dist, an edge is
+    reachable if both of its nodes are.
+    Parameters
+    ----------
+    graph : GraphSnapshot
+        the street graph
+    centre_node : int
+        position of the start node
+    distance : float
+        maximum walking distance, in metres
+    Returns
+    -------
+    edges : numpy array
+        ids of the reachable edges
+    node_distances : numpy array
+        walking distance to every node; inf where it's beyond distance
+    """
+    node_distances = dijkstra(graph.csgraph, indices=centre_node, limit=distance)
+    reached = np.isfinite(node_distances)
+    edges = np.flatnonzero(reached[graph.edge_u] & reached[graph.edge_v])
+    return edges, node_distances
+
+
+def reached_distances(graph, centre_node, distance, table=None):
+    """
+    The edges within walking distance of a node, as reachable_edges finds them, and the
+    walking distance to the farther end of each. They're looked up in the hot zone
+    table if it's given and covers the node (see hotzones.py), and found with a bounded
+    Dijkstra otherwise.
+    Returns
+    -------
+    edges : numpy array
+        ids of the reachable edges
+    farthest : numpy array
+        for each edge, the walking distance to its farther node
+    """
+    hit = None if table is None else table.reached(centre_node, distance)
+    if hit is None:
+        edges, node_distances = reachable_edges(graph, centre_node, distance)
+        farthest = np.maximum(
+            node_distances[graph.edge_u[edges]], node_distances[graph.edge_v[edges]]
+        )
+        return edges, farthest
+    edges, du, dv = hit
+    # an unreached end is UNREACHED, which is further than any distance the table covers
+    farthest = np.maximum(du, dv)
+    within = farthest <= distance
+    return edges[within].astype(np.intp), farthest[within].astype(np.float64)
+
+
+def end_distances(graph, centre_node, distance, table=None):
+    """
+    The edges with at least one end within walking distance of a node, and the walking
+    distance to each end, from the hot zone table or a bounded Dijkstra, as in
+    reached_distances.
+    Returns
+    -------
+    edges : numpy array
+        ids of the edges
+    du, dv : numpy array
+        walking distance to each end of each edge; inf where it's beyond distance
+    """
+    hit = None if table is None else table.reached(centre_node, distance)
+    if hit is None:
+        node_distances = dijkstra(graph.csgraph, indices=centre_node, limit=distance)
+        du = node_distances[graph.edge_u]
+        dv = node_distances[graph.edge_v]
+        edges = np.flatnonzero(np.isfinite(du) | np.isfinite(dv))
+        return edges, du[edges], dv[edges]
+    edges, du, dv = hit
+    # UNREACHED is further than any distance the table covers
+    du = np.where(du <= distance, du, np.inf)
+    dv = np.where(dv <= distance, dv, np.inf)
+    within = np.isfinite(du) | np.isfinite(dv)
+    return edges[within].astype(np.intp), du[within], dv[within]
+
+
+def isochrone_cut(graph, centre_node, thresholds, table=None):
+    """
+    Like isochrone_distances, but rather than leaving out the edges that are only partly
+    within the largest threshold, keep the part of each that is, cutting it where the
+    remaining walking distance runs out. An edge whose ends are both reachable, but
+    whose middle isn't, is kept as two pieces. The cuts are given as fractions along
+    each edge, so they can be made as the geometries are read (see
+    GraphSnapshot.edge_coords), a chunk at a time if need be.
+    Parameters
+    ----------
+    graph : GraphSnapshot
+        the street graph
+    centre_node : int
+        position of the start node
+    thresholds : list
+        band limits, in metres
+    table : HotZoneTable
+        optional precomputed isochrones (see reached_distances)
+    Returns
+    -------
+    edges : numpy array
+        the edge id of each line, nearest first; an edge can appear twice
+    distances : numpy array
+        for each line, the walking distance to its farther end
+    bands : numpy array
+        for each line, the smallest threshold within which all of it is reachable
+    start, end : numpy array
+        for each line, the stretch of its edge it covers, as fractions of the edge's
+        length from its first vertex
+    """
+    thresholds = np.unique(np.asarray(thresholds, dtype=np.float64))
+    limit = thresholds[-1]
+    edges, du, dv = end_distances(graph, centre_node, limit, table)
+    length = graph.edge_length[edges]
+    # how much of each edge is reachable from either end, as a fraction of its length
+    reach = []
+    for d in (du, dv):
+        fraction = np.divide(limit - d, length, out=np.ones(len(d)), where=length > 0)
+        reach.append(np.where(np.isfinite(d), np.clip(fraction, 0, 1), 0))
+    reach_u, reach_v = reach
+    whole = reach_u + reach_v >= 1
+    from_u = np.flatnonzero(~whole & (reach_u > 0))
+    from_v = np.flatnonzero(~whole & (reach_v > 0))
+    whole = np.flatnonzero(whole)
+    lines = np.concatenate([whole, from_u, from_v])
+    start = np.concatenate([np.zeros(len(whole) + len(from_u)), 1 - reach_v[from_v]])
+    end = np.concatenate([np.ones(len(whole)), reach_u[from_u], np.ones(len(from_v))])
+    # a cut piece ends where the walking distance runs out
+    distances = np.minimum(np.maximum(du, dv), limit)[lines]
+    order = np.argsort(distances, kind="stable")
+    lines = lines[order]
+    distances = distances[order]
+    bands = thresholds[np.searchsorted(thresholds, distances)]
+    return edges[lines], distances, bands, start[order], end[order]
+
+
+def isochrone_distances(graph, centre_node, thresholds, table=None):
+    """
+    Tag the edges within walking distance of a node with distance bands, using a single
+    bounded Dijkstra out to the largest threshold (or the hot zone table), and order
+    them by walking distance, nearest first.
+    Parameters
+    ----------
+    graph : GraphSnapshot
+        the street graph
+    centre_node : int
+        position of the start node
+    thresholds : list
+        band limits, in metres
+    table : HotZoneTable
+        optional precomputed isochrones (see reached_distances)
+    Returns
+    -------
+    edges : numpy array
+        ids of the edges reachable within the largest threshold
+    distances : numpy array
+        for each edge, the walking distance to its farther node
+    bands : numpy array
+        for each edge, the smallest threshold within which both of its nodes are reachable
+    """
+    thresholds = np.unique(np.asarray(thresholds, dtype=np.float64))
+    edges, farthest = reached_distances(graph, centre_node, thresholds[-1], table)
+    order = np.argsort(farthest, kind="stable")
+    edges = edges[order]
+    farthest = farthest[order]
+    return edges, farthest, thresholds[np.searchsorted(thresholds, farthest)]
+
+
+def alpha_shape(points, alpha):
+    """
+    Concave hull of some points: the union of the triangles of their Delaunay
+    triangulation whose circumradius is at most alpha.
+    Parameters
+    ----------
+    points : numpy array
+        projected (x, y) coordinates
+    alpha : float
+        largest circumradius kept, in the same units; a bigger alpha is closer to the
+        convex hull
+    Returns
+    -------
+    hull : shapely geometry
+    """
+    # the triangulation is the slow part, so duplicate points (streets share their
+    # ends) are dropped first, snapping to a grid of whole units to find them cheaply
+    grid = np.round(points).astype(np.int64)
+    grid -= grid.min(axis=0, initial=0)
+    _, first = np.unique(grid[:, 0] << 32 | grid[:, 1], return_index=True)
+    points = points[first]
+    try:
+        triangulation = Delaunay(points)
+    except (QhullError, ValueError):
+        # too few points, or all in a line
+        return MultiPoint(points).convex_hull
+    triangles = triangulation.simplices
+    a, b, c = (points[triangles[:, i]] for i in range(3))
+    ab = b - a
+    ac = c - a
+    area = np.abs(ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0]) / 2
+    sides = np.hypot(*(a - b).T) * np.hypot(*(b - c).T) * np.hypot(*(c - a).T)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        keep = (area > 0) & (sides / (4 * area) <= alpha)
+    # rather than union thousands of triangles, polygonize the sides that only one
+    # kept triangle has: the outline of the kept area, and of the holes in it
+    kept = triangles[keep]
+    first = np.concatenate([kept[:, 0], kept[:, 1], kept[:, 2]])
+    second = np.concatenate([kept[:, 1], kept[:, 2], kept[:, 0]])
+    sides, counts = np.unique(
+        np.minimum(first, second) * len(points) + np.maximum(first, second),
+        return_counts=True,
     )
-    # we MAY need .to_crs("EPSG:4326")
-    return gdf_truncated["geometry"]
+    ends = np.column_stack(np.divmod(sides[counts == 1], len(points)))
+    faces = list(polygonize([LineString(side) for side in points[ends]]))
+    # a face is either all kept triangles or a hole
+    centres = [face.representative_point().coords[0] for face in faces]
+    inside = triangulation.find_simplex(np.array(centres).reshape(-1, 2))
+    return unary_union([face for face, i in zip(faces, inside) if i >= 0 and keep[i]])
+
+
+def isochrone_polygons(graph, centre_node, thresholds, alpha, buffer, table=None):
+    """
+    The area within walking distance of a node, as a polygon for each band: the
+    alpha_shape of the vertices of the streets in it and all the nearer bands, buffered.
+    Parameters
+    ----------
+    graph : GraphSnapshot
+        the street graph
+    centre_node : int
+        position of the start node
+    thresholds : list
+        band limits, in metres
+    alpha : float
+        see alpha_shape, in metres
+    buffer : float
+        how far to buffer each polygon, in metres
+    table : HotZoneTable
+        optional precomputed isochrones (see reached_distances)
+    Returns
+    -------
+    thresholds : numpy array
+        the distinct thresholds, in ascending order
+    polygons : list
+        WGS84 shapely geometry for each threshold
+    """
+    thresholds = np.unique(np.asarray(thresholds, dtype=np.float64))
+    edges, farthest = reached_distances(graph, centre_node, thresholds[-1], table)
+    polygons = []
+    for threshold in thresholds:
+        _, coords = graph.edge_coords(edges[farthest <= threshold], buffer / 4)
+        x, y = graph.project(coords[:, 0], coords[:, 1])
+        hull = alpha_shape(np.column_stack([x, y]), alpha).buffer(buffer)
+        polygons.append(transform(graph.unproject, hull.simplify(buffer / 4)))
+    return thresholds, polygons